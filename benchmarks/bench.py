@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from replay_server import ReplayConfig, ReplayServer, WORDS, synthetic_paper
+
+# 离线基准：在本地替身服务器上依次跑各个阶段，每个阶段在独立的子进程里执行，
+# 这样峰值 RSS 和 CPU 时间只算这一个阶段；结果按提交号存成 JSON，可以用 --compare 对比两次运行
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'claude_arxiv'), os.path.join(ROOT, 'tape_arxiv_2023_scraper', 'src')]
+
+# 每个阶段对应服务器统计里的路由，用来算 pages/sec 和 MB/s
+ROUTES = {
+    'harvest': ['oai'],
+    'pdf': ['pdf'],
+    'listing': ['listing'],
+    's2': ['s2-batch', 's2-neighbors'],
+    'process': [],
+}
+
+
+def cpu_seconds():
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+def peak_rss_mb():
+    # Linux 上 ru_maxrss 的单位是 KB；进程池里的子进程单独计
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return max(u.ru_maxrss for u in usage) / 1024
+
+
+class StageTimer:
+    # 阶段函数做完准备工作后调用 start()，只计热路径的时间
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.wall = time.perf_counter()
+        self.cpu = cpu_seconds()
+
+    def elapsed(self):
+        return time.perf_counter() - self.wall, cpu_seconds() - self.cpu
+
+
+def bench_harvest(args, workdir, timer):
+    from oai_harvest import harvest
+
+    timer.start()
+    papers = harvest(args.start_date, args.end_date, 'cs', until_padding=0, delay=0,
+                     pipelined=args.pipelined, progress=False)
+    return sum(1 for _ in papers)
+
+
+def bench_pdf(args, workdir, timer):
+    from pdf_download import PdfDownloader
+    from pdf_store import PdfStore
+
+    downloader = PdfDownloader(PdfStore(os.path.join(workdir, 'pdfs')), workers=args.workers,
+                               requests_per_second=None)
+    arxiv_ids = [f'2401.{i:05d}' for i in range(args.pdfs)]
+    timer.start()
+    return sum(1 for _, success, _ in downloader.download_all(arxiv_ids) if success)
+
+
+def bench_listing(args, workdir, timer):
+    from arxiv_listing import ListingCrawler, merge_pages, month_range
+    from s2_client import AdaptiveRateLimiter
+
+    limiter = AdaptiveRateLimiter(rate=args.rate, max_rate=args.rate)
+    crawler = ListingCrawler(os.path.join(workdir, 'listing'), limiter=limiter, concurrency=args.workers)
+    timer.start()
+    paths = asyncio.run(crawler.crawl(month_range(args.start_month, args.end_month)))
+    return len(merge_pages(paths, os.path.join(workdir, 'listing.csv')))
+
+
+def bench_s2(args, workdir, timer):
+    from s2_client import AdaptiveRateLimiter, ResponseCache, S2Client
+
+    cache = ResponseCache(os.path.join(workdir, 's2_cache.sqlite'))
+    client = S2Client(cache, limiter=AdaptiveRateLimiter(rate=args.rate, max_rate=args.rate),
+                      concurrency=args.workers)
+    arxiv_ids = [f'2301.{i:05d}' for i in range(args.papers)]
+    timer.start()
+    stats = asyncio.run(client.enrich(arxiv_ids, 'title,abstract,citations,references,citationCount,referenceCount'))
+    cache.close()
+    return stats['fetched']
+
+
+def bench_process(args, workdir, timer):
+    # 图构建不访问网络：先用合成记录填一个 paper_info 库，再计读取、打标签、特征和建边的时间
+    import types
+    import numpy as np
+    import pandas as pd
+    from encoders import word2vec_features
+    from paper_info_store import PaperInfoStore
+    from process import build_edges, map_labels, read_paper_info, to_csr
+
+    store = PaperInfoStore(os.path.join(workdir, 'paper_info.sqlite'))
+    config = ReplayConfig()
+    rng = np.random.default_rng(0)
+    for i in range(args.papers):
+        arxiv_id = f'2301.{i:05d}'
+        paper = synthetic_paper(config, arxiv_id, '2023-01-01')
+        store.put(arxiv_id, {
+            'paperId': f'p{i}', 'arxiv_id': arxiv_id, 'title': paper['title'], 'abstract': paper['abstract'],
+            'subject': f"Category ({paper['categories'][0]})",
+            'references': [{'paperId': f'p{j}'} for j in rng.integers(0, args.papers * 2, 20)],
+            'citations': [{'paperId': f'p{j}'} for j in rng.integers(0, args.papers * 2, 20)],
+        })
+    store.flush()
+    vocabulary = WORDS + [f'w{i}' for i in range(20000)]
+    model = types.SimpleNamespace(key_to_index={word: i for i, word in enumerate(vocabulary)},
+                                  vectors=rng.random((len(vocabulary), 300), dtype=np.float32))
+    category2label = pd.Series(np.arange(8), index=['ai', 'cv', 'lg', 'cl', 'ro', 'cr', 'oc', 'ml'])
+
+    timer.start()
+    columns, neighbors = read_paper_info(store, args.workers)
+    map_labels(pd.Series(columns['subject'], dtype=object), category2label)
+    word2vec_features(model, [f"Title: {ti}\n Abstract: {ab}" for ti, ab in zip(columns['title'], columns['abstract'])])
+    src, dst = build_edges(columns['paperId'], neighbors)
+    to_csr(src, dst, len(columns['paperId']))
+    store.close()
+    return len(columns['paperId'])
+
+
+STAGES = {
+    'harvest': bench_harvest,
+    'pdf': bench_pdf,
+    'listing': bench_listing,
+    's2': bench_s2,
+    'process': bench_process,
+}
+
+
+def run_stage(args):
+    # 子进程入口：跑一个阶段，最后一行输出 JSON
+    with tempfile.TemporaryDirectory() as workdir:
+        timer = StageTimer()
+        records = STAGES[args.stage](args, workdir, timer)
+        wall, cpu = timer.elapsed()
+    print(json.dumps({'records': records, 'seconds': wall, 'cpu_seconds': cpu, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def stage_report(result, stats):
+    seconds = result['seconds'] or 1e-9
+    pages = sum(route['requests'] - route['errors'] for route in stats.values())
+    errors = sum(route['errors'] for route in stats.values())
+    mb = sum(route['bytes'] for route in stats.values()) / 1e6
+    return {
+        **result,
+        'records_per_sec': result['records'] / seconds,
+        'pages': pages,
+        'pages_per_sec': pages / seconds,
+        'injected_errors': errors,
+        'mb': mb,
+        'mb_per_sec': mb / seconds,
+        'cpu_util': result['cpu_seconds'] / seconds,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def stage_argv(args):
+    return ['--start-date', args.start_date, '--end-date', args.end_date,
+            '--start-month', str(args.start_month), '--end-month', str(args.end_month),
+            '--pdfs', str(args.pdfs), '--papers', str(args.papers), '--workers', str(args.workers),
+            '--rate', str(args.rate)] + (['--pipelined'] if args.pipelined else [])
+
+
+def run_all(args):
+    config = ReplayConfig(records_per_day=args.records_per_day, page_size=args.page_size,
+                          listing_per_month=args.listing_per_month, pdf_size=args.pdf_size,
+                          latency=args.latency, error_rate=args.error_rate, retry_after=args.retry_after,
+                          fixtures=args.fixtures)
+    report = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': vars(config), 'stages': {}}
+    with ReplayServer(config) as server:
+        env = {**os.environ, **server.env()}
+        for stage in args.stages:
+            server.stats(reset=True)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--stage', stage] + stage_argv(args),
+                                    env=env, capture_output=True, text=True)
+            if output.returncode != 0:
+                print(f'{stage}: failed\n{output.stderr[-2000:]}')
+                report['stages'][stage] = {'error': output.stderr[-2000:]}
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            stats = {route: s for route, s in server.stats().items() if route in ROUTES[stage]}
+            report['stages'][stage] = stage_report(result, stats)
+            print_stage(stage, report['stages'][stage])
+
+    os.makedirs(args.results, exist_ok=True)
+    path = os.path.join(args.results, f"{report['commit']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {path}')
+    return [stage for stage, r in report['stages'].items() if 'error' in r]
+
+
+def print_stage(stage, r):
+    print(f"{stage:8s} {r['seconds']:8.2f}s  {r['records_per_sec']:10.1f} rec/s  {r['pages_per_sec']:8.2f} pages/s  "
+          f"{r['mb_per_sec']:8.2f} MB/s  rss {r['peak_rss_mb']:7.1f} MB  cpu {r['cpu_util'] * 100:5.0f}%")
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for stage, after in new['stages'].items():
+        before = old['stages'].get(stage)
+        if not before:
+            continue
+        if 'error' in before or 'error' in after:
+            print(f"{stage:8s} failed in {old['commit'] if 'error' in before else new['commit']}")
+            continue
+        changes = []
+        for metric in ('records_per_sec', 'pages_per_sec', 'mb_per_sec', 'peak_rss_mb', 'cpu_seconds'):
+            if before[metric]:
+                changes.append(f"{metric} {after[metric] / before[metric]:.2f}x")
+        print(f"{stage:8s} " + '  '.join(changes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks against the local replay server')
+    parser.add_argument('stages', nargs='*', default=list(STAGES), help=f'stages to run, from {list(STAGES)}')
+    parser.add_argument('--stage', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--results', type=str, default=os.path.join(ROOT, 'benchmarks', 'results'))
+    # 工作量
+    parser.add_argument('--start-date', type=str, default='2024-08-01')
+    parser.add_argument('--end-date', type=str, default='2024-08-10')
+    parser.add_argument('--start-month', type=int, default=2301)
+    parser.add_argument('--end-month', type=int, default=2303)
+    parser.add_argument('--pdfs', type=int, default=200)
+    parser.add_argument('--papers', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1000.0, help='rate limit for the async clients, requests/sec')
+    parser.add_argument('--pipelined', action='store_true', help='harvest with the prefetching pipeline')
+    # 服务器
+    parser.add_argument('--records-per-day', type=int, default=1000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--listing-per-month', type=int, default=5000)
+    parser.add_argument('--pdf-size', type=int, default=512 * 1024)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=0)
+    parser.add_argument('--fixtures', type=str, default=None)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.stage:
+        run_stage(args)
+    else:
+        unknown = set(args.stages) - set(STAGES)
+        if unknown:
+            parser.error(f'unknown stages {sorted(unknown)}')
+        # 有阶段失败时以非零状态退出，报告照常写出
+        failed = run_all(args)
+        if failed:
+            sys.exit(f'failed stages: {failed}')
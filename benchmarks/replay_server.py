@@ -0,0 +1,438 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+# 本地替身服务器：按 arXiv OAI-PMH、列表页、PDF 和 Semantic Scholar 的接口格式返回合成数据，
+# 或者回放事先录下的响应；可以配置延迟、按比例注入 503/429 以及 Retry-After，用来离线压测各个抓取脚本
+# 抓取代码通过 ARXIV_OAI_URL / ARXIV_PDF_URL / ARXIV_LISTING_URL / S2_API_URL 环境变量指向这里
+
+# 录制模式下，按路径前缀把未命中的请求转发到真实服务
+UPSTREAMS = {
+    '/oai2': 'http://export.arxiv.org',
+    '/list/': 'https://arxiv.org',
+    '/pdf/': 'https://arxiv.org',
+    '/graph/': 'https://api.semanticscholar.org',
+}
+
+SUBJECTS = ['cs.AI', 'cs.CV', 'cs.LG', 'cs.CL', 'cs.RO', 'cs.CR', 'math.OC', 'stat.ML']
+SUBJECT_NAMES = {
+    'cs.AI': 'Artificial Intelligence', 'cs.CV': 'Computer Vision and Pattern Recognition',
+    'cs.LG': 'Machine Learning', 'cs.CL': 'Computation and Language', 'cs.RO': 'Robotics',
+    'cs.CR': 'Cryptography and Security', 'math.OC': 'Optimization and Control', 'stat.ML': 'Machine Learning',
+}
+WORDS = ('graph neural network learning model data training language vision robust efficient '
+         'adaptive transformer attention sparse optimization benchmark dataset inference').split()
+
+
+class ReplayConfig:
+    def __init__(self, records_per_day=200, page_size=1000, listing_per_month=5000, pdf_size=512 * 1024,
+                 latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1, missing_rate=0.02, neighbors=40,
+                 fixtures=None, record=False, seed=0):
+        self.records_per_day = records_per_day
+        self.page_size = page_size
+        self.listing_per_month = listing_per_month
+        self.pdf_size = pdf_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.missing_rate = missing_rate
+        self.neighbors = neighbors
+        self.fixtures = fixtures
+        self.record = record
+        self.seed = seed
+
+
+def _rng(config, *key):
+    # 同一个 id 每次生成的内容都一样，录制结果和合成结果都可以跨提交对比
+    return random.Random(f'{config.seed}:' + ':'.join(map(str, key)))
+
+
+def _words(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def synthetic_paper(config, arxiv_id, created):
+    rng = _rng(config, 'paper', arxiv_id)
+    categories = rng.sample(SUBJECTS, rng.randint(1, 3))
+    return {
+        'arxiv_id': arxiv_id,
+        'title': _words(rng, 8).capitalize(),
+        'authors': [(f'Author{rng.randint(1, 999)}', f'F{rng.randint(1, 99)}') for _ in range(rng.randint(1, 6))],
+        'abstract': _words(rng, 150),
+        'categories': categories,
+        'created': created,
+    }
+
+
+def _day_ids(config, day):
+    # 每天的论文编号形如 2408.00123：yymm + 当月内的序号，保证同一窗口内不重复
+    stamp = day.strftime('%y%m')
+    base = (day.day - 1) * config.records_per_day
+    return [f'{stamp}.{base + i:05d}' for i in range(config.records_per_day)]
+
+
+def _window_ids(config, start, until):
+    day = datetime.strptime(start, '%Y-%m-%d')
+    end = datetime.strptime(until, '%Y-%m-%d')
+    ids = []
+    while day <= end:
+        ids.extend((arxiv_id, day.strftime('%Y-%m-%d')) for arxiv_id in _day_ids(config, day))
+        day += timedelta(days=1)
+    return ids
+
+
+def list_records(config, query):
+    # resumptionToken 直接编码 from|until|set|offset，服务器不需要保存会话状态
+    if 'resumptionToken' in query:
+        start, until, set_spec, offset = query['resumptionToken'].split('|')
+        offset = int(offset)
+    else:
+        start, until, set_spec, offset = query['from'], query['until'], query.get('set', ''), 0
+    ids = _window_ids(config, start, until)
+    page = ids[offset:offset + config.page_size]
+
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+             f'<responseDate>{datetime.utcnow():%Y-%m-%dT%H:%M:%SZ}</responseDate>']
+    if not page:
+        parts.append('<error code="noRecordsMatch">No records</error></OAI-PMH>')
+        return ''.join(parts).encode('utf-8')
+
+    parts.append('<ListRecords>')
+    for arxiv_id, created in page:
+        paper = synthetic_paper(config, arxiv_id, created)
+        authors = ''.join(f'<author><keyname>{escape(last)}</keyname><forenames>{escape(first)}</forenames></author>'
+                          for last, first in paper['authors'])
+        parts.append(
+            f'<record><header><identifier>oai:arXiv.org:{arxiv_id}</identifier><datestamp>{created}</datestamp>'
+            f'<setSpec>{escape(set_spec or "cs")}</setSpec></header><metadata>'
+            f'<arXiv xmlns="http://arxiv.org/OAI/arXiv/"><id>{arxiv_id}</id><created>{created}</created>'
+            f'<authors>{authors}</authors><title>{escape(paper["title"])}</title>'
+            f'<categories>{" ".join(paper["categories"])}</categories>'
+            f'<abstract>{escape(paper["abstract"])}</abstract></arXiv></metadata></record>')
+    next_offset = offset + len(page)
+    if next_offset < len(ids):
+        token = f'{start}|{until}|{set_spec}|{next_offset}'
+        parts.append(f'<resumptionToken cursor="{offset}" completeListSize="{len(ids)}">{escape(token)}</resumptionToken>')
+    else:
+        parts.append(f'<resumptionToken cursor="{offset}" completeListSize="{len(ids)}"/>')
+    parts.append('</ListRecords></OAI-PMH>')
+    return ''.join(parts).encode('utf-8')
+
+
+def list_sets():
+    specs = ['cs', 'math', 'stat', 'physics:astro-ph'] + [f'cs:cs:{s.split(".")[1]}' for s in SUBJECTS if s.startswith('cs.')]
+    sets = ''.join(f'<set><setSpec>{spec}</setSpec><setName>{spec}</setName></set>' for spec in specs)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+            f'<ListSets>{sets}</ListSets></OAI-PMH>').encode('utf-8')
+
+
+def listing_page(config, month, skip, show):
+    total = config.listing_per_month
+    entries = []
+    for i in range(skip, min(skip + show, total)):
+        arxiv_id = f'{month}.{i:05d}'
+        rng = _rng(config, 'listing', arxiv_id)
+        subject = rng.choice(SUBJECTS)
+        entries.append(
+            f'<dt><a name="item{i + 1}">[{i + 1}]</a>\n  <a href ="/abs/{arxiv_id}" title="Abstract" id="{arxiv_id}">\n'
+            f'    arXiv:{arxiv_id}\n  </a></dt>\n<dd><div class=\'meta\'>\n'
+            f'<div class=\'list-title mathjax\'><span class=\'descriptor\'>Title:</span>\n  {_words(rng, 8)}\n</div>\n'
+            f'<div class=\'list-subjects\'><span class=\'descriptor\'>Subjects:</span>\n'
+            f'<span class="primary-subject">{SUBJECT_NAMES[subject]} ({subject})</span></div></div></dd>\n')
+    return (f'<html><body><div class=\'paging\'>Total of {total:,} entries</div><dl id=\'articles\'>\n'
+            + ''.join(entries) + '</dl></body></html>').encode('utf-8')
+
+
+def pdf_body(config, arxiv_id):
+    rng = _rng(config, 'pdf', arxiv_id)
+    head, tail = b'%PDF-1.5\n', b'\n%%EOF\n'
+    filler = bytes(rng.getrandbits(8) for _ in range(256))
+    size = max(config.pdf_size - len(head) - len(tail), 0)
+    return head + (filler * (size // len(filler) + 1))[:size] + tail
+
+
+def s2_paper(config, arxiv_id, fields):
+    rng = _rng(config, 's2', arxiv_id)
+    if rng.random() < config.missing_rate:
+        return None
+    month = arxiv_id.split('.')[0]
+    neighbors = [f'p{month}.{rng.randint(0, config.listing_per_month - 1):05d}' for _ in range(config.neighbors * 2)]
+    paper = {'paperId': f'p{arxiv_id}', 'title': _words(rng, 8).capitalize(), 'abstract': _words(rng, 150),
+             'citationCount': config.neighbors, 'referenceCount': config.neighbors,
+             'citations': [{'paperId': p} for p in neighbors[:config.neighbors]],
+             'references': [{'paperId': p} for p in neighbors[config.neighbors:]]}
+    wanted = set(fields.split(',')) | {'paperId'}
+    return {key: value for key, value in paper.items() if key in wanted}
+
+
+def s2_neighbors(config, arxiv_id, kind, offset, limit):
+    paper = s2_paper(config, arxiv_id, 'citations,references') or {kind: []}
+    key = 'citingPaper' if kind == 'citations' else 'citedPaper'
+    items = paper[kind][offset:offset + limit]
+    body = {'offset': offset, 'data': [{key: item} for item in items]}
+    if offset + limit < len(paper[kind]):
+        body['next'] = offset + limit
+    return body
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _count(self, route, sent, error=False):
+        with self.server.lock:
+            stats = self.server.stats.setdefault(route, {'requests': 0, 'bytes': 0, 'errors': 0})
+            stats['requests'] += 1
+            stats['bytes'] += sent
+            stats['errors'] += error
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _json(self, status, body):
+        self._send(status, json.dumps(body).encode('utf-8'), 'application/json')
+
+    def _inject_faults(self, route):
+        # 先模拟网络延迟，再按 error_rate 随机返回 503（arXiv 风格）或 429（S2 风格）
+        delay = self.config.latency + random.uniform(0, self.config.jitter)
+        if delay:
+            time.sleep(delay)
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            status = 429 if route.startswith('s2') else 503
+            body = b'Retry later'
+            self._send(status, body, 'text/plain', {'Retry-After': str(self.config.retry_after)})
+            self._count(route, len(body), error=True)
+            return True
+        return False
+
+    def _fixture_key(self, body=b''):
+        return hashlib.sha1(self.command.encode() + self.path.encode() + body).hexdigest()[:20]
+
+    def _replay(self, route, body=b''):
+        # 录下的响应优先；录制模式下未命中就转发给真实服务并存下来
+        if self.config.fixtures is None:
+            return False
+        key = self._fixture_key(body)
+        path = os.path.join(self.config.fixtures, key)
+        if not os.path.exists(f'{path}.body') and self.config.record:
+            self._record(path, body)
+        if not os.path.exists(f'{path}.body'):
+            return False
+        with open(f'{path}.json') as f:
+            meta = json.load(f)
+        with open(f'{path}.body', 'rb') as f:
+            content = f.read()
+        self._send(meta['status'], content, meta['content_type'], meta.get('headers'))
+        self._count(route, len(content))
+        return True
+
+    def _record(self, path, body):
+        prefix = next((prefix for prefix in UPSTREAMS if self.path.startswith(prefix)), None)
+        if prefix is None:
+            return
+        request = urllib.request.Request(UPSTREAMS[prefix] + self.path, data=body or None, method=self.command,
+                                         headers={'Content-Type': self.headers.get('Content-Type', 'text/plain')})
+        with urllib.request.urlopen(request, timeout=300) as response:
+            content = response.read()
+            meta = {'status': response.status, 'content_type': response.headers.get('Content-Type', ''),
+                    'headers': {name: response.headers[name] for name in ('ETag', 'Last-Modified',
+                                                                         'Content-Disposition')
+                                if response.headers.get(name)}}
+        os.makedirs(self.config.fixtures, exist_ok=True)
+        with open(f'{path}.body', 'wb') as f:
+            f.write(content)
+        with open(f'{path}.json', 'w') as f:
+            json.dump(meta, f)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/_stats':
+            with self.server.lock:
+                stats = json.loads(json.dumps(self.server.stats))
+                if 'reset' in query:
+                    self.server.stats.clear()
+            return self._json(200, stats)
+
+        route = self._route(url.path)
+        if route is None:
+            return self._send(404, b'Not found', 'text/plain')
+        if self._inject_faults(route) or self._replay(route):
+            return
+
+        if route == 'oai':
+            if query.get('verb') == 'ListSets':
+                body = list_sets()
+            else:
+                body = list_records(self.config, query)
+            self._send(200, body, 'text/xml; charset=utf-8')
+        elif route == 'listing':
+            month = url.path.rstrip('/').split('/')[-1]
+            body = listing_page(self.config, month, int(query.get('skip', 0)), int(query.get('show', 25)))
+            self._send(200, body, 'text/html; charset=utf-8')
+        elif route == 'pdf':
+            body = self._pdf(url.path)
+            if body is None:
+                return
+        elif route == 's2-neighbors':
+            match = re.match(r'.*/paper/arXiv:([^/]+)/(citations|references)$', url.path)
+            body = json.dumps(s2_neighbors(self.config, match.group(1), match.group(2),
+                                           int(query.get('offset', 0)), int(query.get('limit', 100)))).encode()
+            self._send(200, body, 'application/json')
+        self._count(route, len(body))
+
+    def _pdf(self, path):
+        # 支持 ETag 条件请求和 If-Range 续传，行为与 arxiv.org 一致
+        arxiv_id = path[len('/pdf/'):-len('.pdf')]
+        etag = f'"{hashlib.md5(arxiv_id.encode()).hexdigest()}"'
+        headers = {'ETag': etag, 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+                   'Content-Disposition': f'inline; filename="{arxiv_id}v1.pdf"'}
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self._count('pdf', 0)
+            return None
+        body = pdf_body(self.config, arxiv_id)
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') in (etag, headers['Last-Modified']):
+            start = int(match.group(1))
+            headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+            body = body[start:]
+            self.send_response(206)
+            self.send_header('Content-Type', 'application/pdf')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            return body
+        self._send(200, body, 'application/pdf', headers)
+        return body
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not url.path.endswith('/paper/batch'):
+            return self._send(404, b'Not found', 'text/plain')
+        if self._inject_faults('s2-batch') or self._replay('s2-batch', body):
+            return
+        fields = parse_qs(url.query).get('fields', ['title'])[-1]
+        ids = [paper_id.split(':', 1)[-1] for paper_id in json.loads(body)['ids']]
+        content = json.dumps([s2_paper(self.config, arxiv_id, fields) for arxiv_id in ids]).encode()
+        self._send(200, content, 'application/json')
+        self._count('s2-batch', len(content))
+
+    @staticmethod
+    def _route(path):
+        if path.startswith('/oai2'):
+            return 'oai'
+        if path.startswith('/list/'):
+            return 'listing'
+        if path.startswith('/pdf/') and path.endswith('.pdf'):
+            return 'pdf'
+        if path.startswith('/graph/') and re.search(r'/(citations|references)$', path):
+            return 's2-neighbors'
+        return None
+
+
+class ReplayServer:
+    # 在后台线程里运行；env() 给出把各个抓取模块指向本服务器所需的环境变量
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or ReplayConfig()
+        self.httpd.stats = {}
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self):
+        return {
+            'ARXIV_OAI_URL': f'{self.url}/oai2',
+            'ARXIV_PDF_URL': f'{self.url}/pdf/{{arxiv_id}}.pdf',
+            'ARXIV_LISTING_URL': f'{self.url}/list/{{archive}}/{{month}}',
+            'S2_API_URL': f'{self.url}/graph/v1',
+        }
+
+    def stats(self, reset=False):
+        with self.httpd.lock:
+            stats = json.loads(json.dumps(self.httpd.stats))
+            if reset:
+                self.httpd.stats.clear()
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for arXiv OAI-PMH, listing pages, PDFs and Semantic Scholar')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--records-per-day', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=1000, help='records per ListRecords page')
+    parser.add_argument('--listing-per-month', type=int, default=5000)
+    parser.add_argument('--pdf-size', type=int, default=512 * 1024, help='bytes per synthetic PDF')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503/429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--fixtures', type=str, default=None, help='directory of recorded responses to replay')
+    parser.add_argument('--record', action='store_true', help='forward fixture misses upstream and record them')
+    args = parser.parse_args()
+
+    config = ReplayConfig(records_per_day=args.records_per_day, page_size=args.page_size,
+                          listing_per_month=args.listing_per_month, pdf_size=args.pdf_size,
+                          latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          retry_after=args.retry_after, fixtures=args.fixtures, record=args.record)
+    server = ReplayServer(config, port=args.port)
+    for name, value in server.env().items():
+        print(f'export {name}={value}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,87 +1,16 @@
-import xml.etree.ElementTree as ET
-import requests
+import argparse
 import time
-import json
 import os
-import shutil
-from tqdm import tqdm
-from datetime import datetime, timedelta
+from checkpoint import HarvestCheckpoint
+from metrics import METRICS, add_metrics_arguments, configure_metrics, write_metrics
+from oai_harvest import harvest, save_to_jsonl
+from oai_shards import harvest_sharded
+from sinks import ParquetSink, write_papers
 
-def fetch_arxiv_data(start_date, end_date, subject):
-    base_url = "http://export.arxiv.org/oai2"
-    
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    end_date_param = (end_date + timedelta(days=2)).strftime("%Y-%m-%d")
-    
-    params = {
-        "verb": "ListRecords",
-        "metadataPrefix": "arXiv",
-        "from": start_date.strftime("%Y-%m-%d"),
-        "until": end_date_param,
-        "set": f"{subject}"
-    }
-    
-    papers = []
-    total_records = 0
-    processed_records = 0
-    filtered_records = 0
-    
-    print(f"Fetching papers for {subject} from {start_date.date()} to {end_date.date()}")
-    
-    with tqdm(total=None, desc="Fetching papers", unit="paper") as pbar:
-        while True:
-            response = requests.get(base_url, params=params)
-            root = ET.fromstring(response.content)
-            
-            if total_records == 0:
-                total_records_elem = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken[@completeListSize]")
-                if total_records_elem is not None:
-                    total_records = int(total_records_elem.attrib['completeListSize'])
-                    pbar.total = total_records
-                    pbar.refresh()
-            
-            records = root.findall(".//{http://www.openarchives.org/OAI/2.0/}record")
-            for record in records:
-                metadata = record.find(".//{http://arxiv.org/OAI/arXiv/}arXiv")
-                if metadata is not None:
-                    created_date = datetime.strptime(metadata.find("{http://arxiv.org/OAI/arXiv/}created").text.strip(), "%Y-%m-%d")
-                    if start_date <= created_date <= end_date:
-                        paper = {
-                            "title": metadata.find("{http://arxiv.org/OAI/arXiv/}title").text.strip(),
-                            "authors": [author.text.strip() for author in metadata.findall("{http://arxiv.org/OAI/arXiv/}authors/{http://arxiv.org/OAI/arXiv/}author/{http://arxiv.org/OAI/arXiv/}name")],
-                            "abstract": metadata.find("{http://arxiv.org/OAI/arXiv/}abstract").text.strip(),
-                            "categories": metadata.find("{http://arxiv.org/OAI/arXiv/}categories").text.strip(),
-                            "created": created_date.strftime("%Y-%m-%d"),
-                            "doi": metadata.find("{http://arxiv.org/OAI/arXiv/}doi").text.strip() if metadata.find("{http://arxiv.org/OAI/arXiv/}doi") is not None else None,
-                            "arxiv_id": metadata.find("{http://arxiv.org/OAI/arXiv/}id").text.strip()
-                        }
-                        papers.append(paper)
-                        filtered_records += 1
-                        pbar.update(1)
-                processed_records += 1
-            
-            resumption_token = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken")
-            if resumption_token is None or resumption_token.text is None:
-                break
-            
-            params = {"verb": "ListRecords", "resumptionToken": resumption_token.text}
-            
-            time.sleep(2)
-    
-    print(f"\nFetched {filtered_records} papers within the specified date range out of {processed_records} total records")
-    return papers
+def fetch_arxiv_data(start_date, end_date, subject, checkpoint=None):
+    return harvest(start_date, end_date, subject, until_padding=2, pipelined=True, checkpoint=checkpoint)
 
-def save_to_jsonl(papers, filename):
-    print(f"Saving {len(papers)} papers to {filename}")
-    with open(filename, 'w', encoding='utf-8') as jsonl_file:
-        for paper in papers:
-            json.dump(paper, jsonl_file, ensure_ascii=False)
-            jsonl_file.write('\n')
-    print(f"Save completed")
-
-
-def main():
+def main(args):
     start_date = "2024-08-02"
     end_date = "2024-08-04"
     subject = "cs"  # For computer science
@@ -91,15 +20,41 @@ def main():
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
+    # Stream metadata straight into the JSONL file while harvesting
+    filename = f'arxiv_{subject}_{start_date}_to_{end_date}.jsonl'
+    # Parquet output goes to a dataset directory partitioned by created month and primary category
+    sink = ParquetSink(f'arxiv_{subject}_{start_date}_to_{end_date}_parquet', run_id=f'{subject}_{start_date}_to_{end_date}') if args.format == 'parquet' else None
+    configure_metrics(args)
     start_time = time.time()
-    papers = fetch_arxiv_data(start_date, end_date, subject)
+    with METRICS.stage("harvest"):
+        harvest_to_output(args, start_date, end_date, subject, filename, sink)
     end_time = time.time()
     
     print(f"\nTime taken to fetch papers: {end_time - start_time:.2f} seconds")
-    
-    # Save metadata to JSONL file
-    filename = f'arxiv_{subject}_{start_date}_to_{end_date}.jsonl'
-    save_to_jsonl(papers, filename)
+    write_metrics(args)
+
+def harvest_to_output(args, start_date, end_date, subject, filename, sink):
+    if args.shard_days:
+        # Long ranges: harvest date shards in parallel processes; finished shards are kept and skipped on re-runs
+        harvest_sharded(start_date, end_date, subject, filename, shard_days=args.shard_days, processes=args.processes, sink=sink)
+    elif sink is not None:
+        write_papers(fetch_arxiv_data(start_date, end_date, subject), sink)
+    else:
+        checkpoint = HarvestCheckpoint(f"{filename}.checkpoint", {"start_date": start_date, "end_date": end_date, "subject": subject})
+        if args.resume:
+            checkpoint.load()
+        save_to_jsonl(fetch_arxiv_data(start_date, end_date, subject, checkpoint), filename, checkpoint)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted harvest from its checkpoint file')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl',
+                        help='output format; --resume is only supported for jsonl')
+    parser.add_argument('--shard-days', type=int, default=0,
+                        help='split the range into windows of this many days and harvest them in parallel')
+    parser.add_argument('--processes', type=int, default=4,
+                        help='number of worker processes for --shard-days')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    main(args)
@@ -1,111 +1,45 @@
-import xml.etree.ElementTree as ET
-import requests
+import argparse
 import time
-import json
 import os
+import sys
 from tqdm import tqdm
-from datetime import datetime, timedelta
 
-def fetch_arxiv_data(start_date, end_date, subjects):
-    base_url = "http://export.arxiv.org/oai2"
-    
-    papers = []
-    total_records = 0
-    processed_records = 0
-    
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    # Add one day to end_date to include papers from the end date
-    end_date_param = (end_date + timedelta(days=1)).strftime("%Y-%m-%d")
-    # Use the broader 'cs' category for the API request
-    params = {
-        "verb": "ListRecords",
-        "metadataPrefix": "arXiv",
-        "from": start_date.strftime("%Y-%m-%d"),
-        "until": end_date_param,
-        "set": "cs"  # Computer Science
-    }
-    
-    print(f"Fetching papers for Computer Science from {start_date.date()} to {end_date.date()}")
-    
-    with tqdm(total=None, desc="Fetching papers", unit="paper") as pbar:
-        while True:
-            response = requests.get(base_url, params=params)
-            root = ET.fromstring(response.content)
-            
-            if total_records == 0:
-                total_records_elem = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken[@completeListSize]")
-                if total_records_elem is not None:
-                    total_records = int(total_records_elem.attrib['completeListSize'])
-                    pbar.total = total_records
-                    pbar.refresh()
-            
-            records = root.findall(".//{http://www.openarchives.org/OAI/2.0/}record")
-            for record in records:
-                metadata = record.find(".//{http://arxiv.org/OAI/arXiv/}arXiv")
-                if metadata is not None:
-                    created_date = datetime.strptime(metadata.find("{http://arxiv.org/OAI/arXiv/}created").text.strip(), "%Y-%m-%d")
-                    categories = metadata.find("{http://arxiv.org/OAI/arXiv/}categories").text.strip().split()
-                    
-                    # Check if any of the paper's categories match our desired subjects
-                    if start_date <= created_date <= end_date and any(subj in categories for subj in subjects):
-                        paper = {
-                            "title": metadata.find("{http://arxiv.org/OAI/arXiv/}title").text.strip(),
-                            "authors": [author.text.strip() for author in metadata.findall("{http://arxiv.org/OAI/arXiv/}authors/{http://arxiv.org/OAI/arXiv/}author/{http://arxiv.org/OAI/arXiv/}name")],
-                            "abstract": metadata.find("{http://arxiv.org/OAI/arXiv/}abstract").text.strip(),
-                            "categories": categories,
-                            "primary_category": categories[0],  # The first category is typically the primary one
-                            "created": created_date.strftime("%Y-%m-%d"),
-                            "doi": metadata.find("{http://arxiv.org/OAI/arXiv/}doi").text.strip() if metadata.find("{http://arxiv.org/OAI/arXiv/}doi") is not None else None,
-                            "arxiv_id": metadata.find("{http://arxiv.org/OAI/arXiv/}id").text.strip()
-                        }
-                        papers.append(paper)
-                        pbar.update(1)
-                processed_records += 1
-            
-            pbar.total = total_records
-            pbar.n = processed_records
-            pbar.refresh()
-            
-            resumption_token = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken")
-            if resumption_token is None or resumption_token.text is None:
-                break
-            
-            params = {"verb": "ListRecords", "resumptionToken": resumption_token.text}
-            
-            time.sleep(2)
-    
-    print(f"\nFetched {len(papers)} papers within the specified date range and subjects out of {processed_records} total records")
-    return papers
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checkpoint import HarvestCheckpoint
+from metrics import METRICS, add_metrics_arguments, configure_metrics, write_metrics
+from oai_harvest import harvest, save_to_jsonl, read_jsonl
+from pdf_download import PdfDownloader
+from pdf_store import PdfStore, safe_id
+from rate_limit import TokenBucket
+from subject_plan import plan_subjects
 
-def save_to_jsonl(papers, filename):
-    print(f"Saving {len(papers)} papers to {filename}")
-    with open(filename, 'w', encoding='utf-8') as jsonl_file:
-        for paper in papers:
-            json.dump(paper, jsonl_file, ensure_ascii=False)
-            jsonl_file.write('\n')
-    print(f"Save completed")
+# Same store as pdf-download-with-cache.py, so a paper is only ever stored once
+PDF_STORE_DIR = os.environ.get("ARXIV_PDF_STORE", "arxiv_pdf_store")
 
-def download_pdf(arxiv_id, output_folder, subject):
-    pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-    subject_folder = os.path.join(output_folder, subject)
-    if not os.path.exists(subject_folder):
-        os.makedirs(subject_folder)
-    output_path = os.path.join(subject_folder, f"{arxiv_id}.pdf")
-    
-    try:
-        response = requests.get(pdf_url, stream=True)
-        response.raise_for_status()
+def fetch_arxiv_data(start_date, end_date, subjects, checkpoint=None):
+    # Request the narrowest OAI set the server offers for each subject instead of the whole 'cs' set
+    # One limiter for ListSets and every stage keeps 2 seconds between all OAI requests
+    limiter = TokenBucket(1.0 / 2, capacity=1)
+    plans = plan_subjects(subjects, limiter=limiter)
+    for stage, plan in enumerate(plans):
+        if checkpoint is not None:
+            if stage < checkpoint.stage:
+                continue
+            checkpoint.begin_stage(stage)
         
-        with open(output_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        
-        return True
-    except requests.RequestException as e:
-        print(f"Error downloading {arxiv_id}: {e}")
-        return False
+        for paper in harvest(start_date, end_date, plan.set_spec, until_padding=1, pipelined=True, checkpoint=checkpoint,
+                             limiter=limiter):
+            categories = paper["categories"].split()
+            
+            # Keep papers in any of our subjects that an earlier set has not already produced
+            if plan.subjects.isdisjoint(categories) or not plan.skip.isdisjoint(categories):
+                continue
+            paper = paper.to_dict()
+            paper["categories"] = categories
+            paper["primary_category"] = categories[0]  # The first category is typically the primary one
+            yield paper
 
-def main():
+def main(args):
     start_date = "2024-08-01"
     end_date = "2024-08-02"
     subjects = ["cs.CV", "cs.AI"]  # Computer Vision and Artificial Intelligence
@@ -114,26 +48,46 @@ def main():
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
+    filename = f'arxiv_{"_".join(subjects)}_{start_date}_to_{end_date}.jsonl'
+    checkpoint = HarvestCheckpoint(f"{filename}.checkpoint", {"start_date": start_date, "end_date": end_date, "subjects": subjects})
+    if args.resume:
+        checkpoint.load()
+    configure_metrics(args)
     start_time = time.time()
-    papers = fetch_arxiv_data(start_date, end_date, subjects)
+    with METRICS.stage("harvest"):
+        num_papers = save_to_jsonl(fetch_arxiv_data(start_date, end_date, subjects, checkpoint), filename, checkpoint)
     end_time = time.time()
     
     print(f"\nTime taken to fetch papers: {end_time - start_time:.2f} seconds")
     
-    filename = f'arxiv_{"_".join(subjects)}_{start_date}_to_{end_date}.jsonl'
-    save_to_jsonl(papers, filename)
-    
-    print(f"\nDownloading PDFs for {len(papers)} papers")
+    print(f"\nDownloading PDFs for {num_papers} papers")
     successful_downloads = 0
-    with tqdm(total=len(papers), desc="Downloading PDFs", unit="pdf") as pbar:
-        for paper in papers:
-            if download_pdf(paper['arxiv_id'], output_folder, paper['primary_category']):
+    store = PdfStore(PDF_STORE_DIR)
+    # PDFs downloaded into output_folder by older versions of this script go into the store without a request
+    imported = store.import_pdf_dir(output_folder)
+    if imported:
+        print(f"Imported {imported} existing PDFs from {output_folder} into {PDF_STORE_DIR}")
+    downloader = PdfDownloader(store, workers=8, requests_per_second=1.0)
+    arxiv_ids = (paper['arxiv_id'] for paper in read_jsonl(filename))
+    with METRICS.stage("download"), tqdm(total=num_papers, desc="Downloading PDFs", unit="pdf") as pbar:
+        for _, success, _ in downloader.download_all(arxiv_ids):
+            if success:
                 successful_downloads += 1
             pbar.update(1)
-            time.sleep(1)  # Be nice to the arXiv servers
     
-    print(f"\nSuccessfully downloaded {successful_downloads} out of {len(papers)} PDFs")
-    print(f"\nTotal papers fetched and saved: {len(papers)}")
+    # Lay out the per-primary-category view as links into the store
+    with METRICS.stage("organize"):
+        for paper in read_jsonl(filename):
+            store.link(paper['arxiv_id'], os.path.join(output_folder, paper['primary_category'], f"{safe_id(paper['arxiv_id'])}.pdf"))
+    
+    print(f"\nSuccessfully downloaded {successful_downloads} out of {num_papers} PDFs")
+    print(f"\nTotal papers fetched and saved: {num_papers}")
+    write_metrics(args)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted harvest from its checkpoint file')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,77 @@
+import json
+import os
+
+
+class HarvestCheckpoint:
+    # 记录断点：下一页的 resumptionToken、已写入的记录数、输出文件偏移量和本次运行的参数
+    # 每处理完一页就原子地更新一次（先写临时文件再 os.replace）
+    def __init__(self, path, run_params):
+        self.path = path
+        self.run_params = run_params
+        self.token = None
+        self.records_written = 0
+        self.offset = 0
+        self.done = False
+        self.resumed = False
+        self.stage = 0
+        self._output = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            print(f"No checkpoint found at {self.path}, starting from scratch")
+            return False
+        with open(self.path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state["run_params"] != self.run_params:
+            raise ValueError(f"Checkpoint {self.path} was written for {state['run_params']}, not {self.run_params}")
+        self.token = state["token"]
+        self.records_written = state["records_written"]
+        self.offset = state["offset"]
+        self.done = state["done"]
+        self.stage = state.get("stage", 0)
+        self.resumed = True
+        print(f"Resuming from checkpoint: {self.records_written} records already written")
+        return True
+
+    def open_output(self, filename):
+        if self.resumed:
+            # 截掉上次崩溃时写了一半、还没记进断点的内容
+            self._output = open(filename, 'r+', encoding='utf-8')
+            self._output.seek(self.offset)
+            self._output.truncate()
+        else:
+            self._output = open(filename, 'w', encoding='utf-8')
+            self.records_written = 0
+            self.offset = 0
+        return self._output
+
+    def begin_stage(self, stage):
+        # 一次运行需要依次抓取多个 OAI set 时，每个 set 是一个阶段，各自有一条 resumptionToken 链
+        if stage != self.stage:
+            self.stage = stage
+            self.token = None
+            self.done = False
+            self.resumed = False
+
+    def commit(self, token):
+        if self._output is not None:
+            self._output.flush()
+            os.fsync(self._output.fileno())
+            self.offset = self._output.tell()
+        self.token = token
+        self.done = token is None
+
+        state = {
+            "run_params": self.run_params,
+            "token": self.token,
+            "records_written": self.records_written,
+            "offset": self.offset,
+            "done": self.done,
+            "stage": self.stage,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,191 @@
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 进程内的指标登记处：计数器、带上下限的仪表和直方图，按 (名字, 标签) 区分；线程安全
+# 热路径上只做一次加锁和几次加法，没有打开导出时开销可以忽略
+# 用法：METRICS.inc("http_responses_total", endpoint="oai", status=200)
+#       with METRICS.timer("http_request_seconds", endpoint="oai"): ...
+#       with METRICS.stage("harvest"): ...   # 统计阶段耗时，并可按阶段打开 cProfile
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # 按桶的上界估计分位数，够看出尾延迟的量级
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.profile_stages = set()
+        self.profile_dir = "."
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, value, **labels):
+        # 仪表同时记下出现过的最大值，队列深度这类指标看峰值更有用
+        key = self._key(name, labels)
+        with self._lock:
+            _, peak = self.gauges.get(key, (value, value))
+            self.gauges[key] = (value, max(peak, value))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, name):
+        profiler = None
+        if name in self.profile_stages or "all" in self.profile_stages:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            with self.timer("stage_seconds", stage=name):
+                yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(path)
+                print(f"Profile of stage {name} ({time.perf_counter() - start:.1f}s) written to {path}")
+
+    def to_prometheus(self):
+        def fmt(name, labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return name
+            return name + "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for kind, items in (("counter", self.counters), ("gauge", self.gauges), ("histogram", self.histograms)):
+                declared = set()
+                for (name, labels), value in sorted(items.items(), key=lambda item: item[0]):
+                    if name not in declared:
+                        lines.append(f"# TYPE {name} {kind}")
+                        declared.add(name)
+                    if kind == "counter":
+                        lines.append(f"{fmt(name, labels)} {value}")
+                    elif kind == "gauge":
+                        lines.append(f"{fmt(name, labels)} {value[0]}")
+                        lines.append(f"{fmt(name + '_max', labels)} {value[1]}")
+                    else:
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + ("+Inf",), value.counts):
+                            cumulative += count
+                            lines.append(f"{fmt(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+                        lines.append(f"{fmt(name + '_sum', labels)} {value.sum}")
+                        lines.append(f"{fmt(name + '_count', labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        def label_str(labels):
+            return ",".join(f"{k}={v}" for k, v in labels) or "-"
+
+        with self._lock:
+            return {
+                "started": self.started,
+                "wall_seconds": time.time() - self.started,
+                "counters": _group((name, label_str(labels), value) for (name, labels), value in self.counters.items()),
+                "gauges": _group((name, label_str(labels), {"last": value[0], "max": value[1]})
+                                 for (name, labels), value in self.gauges.items()),
+                "histograms": _group((name, label_str(labels), {
+                    "count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99), "max": h.max,
+                }) for (name, labels), h in self.histograms.items()),
+            }
+
+    def write(self, path):
+        # .prom / .txt 写成 Prometheus 文本格式（可以交给 node_exporter 的 textfile collector），其他写成 JSON 报告
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if path.endswith((".prom", ".txt")):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.report(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _group(rows):
+    grouped = {}
+    for name, labels, value in rows:
+        grouped.setdefault(name, {})[labels] = value
+    return grouped
+
+
+METRICS = Metrics()
+
+
+def add_metrics_arguments(parser, upper=False):
+    # upper=True 用 tape_arxiv_2023_scraper 的参数写法（--METRICS、--PROFILE、--PROFILE_DIR），dest 都一样
+    names = ('--METRICS', '--PROFILE', '--PROFILE_DIR') if upper else ('--metrics', '--profile', '--profile-dir')
+    parser.add_argument(names[0], dest='metrics', type=str, default=None,
+                        help='write run metrics to this file (.prom for Prometheus text, otherwise JSON)')
+    parser.add_argument(names[1], dest='profile', action='append', default=[], metavar='STAGE',
+                        help='run cProfile over this stage ("all" for every stage), can be repeated')
+    parser.add_argument(names[2], dest='profile_dir', type=str, default='profiles',
+                        help=f'directory for the .prof files written by {names[1]}')
+
+
+def configure_metrics(args):
+    METRICS.profile_stages = set(args.profile)
+    METRICS.profile_dir = args.profile_dir
+
+
+def write_metrics(args):
+    if args.metrics:
+        METRICS.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
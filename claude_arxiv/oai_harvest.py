@@ -0,0 +1,269 @@
+import os
+import xml.etree.ElementTree as ET
+import requests
+import time
+import json
+import re
+import queue
+import threading
+from xml.sax.saxutils import unescape
+from tqdm import tqdm
+from datetime import datetime, timedelta
+from metrics import METRICS
+from rate_limit import TokenBucket
+from records import PAPER_FIELDS, Paper
+from sinks import JsonlSink, write_papers
+
+# ARXIV_OAI_URL 可以把请求指向本地的回放服务器（见 benchmarks/）
+BASE_URL = os.environ.get("ARXIV_OAI_URL", "http://export.arxiv.org/oai2")
+OAI = "{http://www.openarchives.org/OAI/2.0/}"
+ARXIV = "{http://arxiv.org/OAI/arXiv/}"
+
+# resumptionToken 总在页尾；最后一页是自闭合的 <resumptionToken .../>
+_TOKEN_RE = re.compile(rb"<resumptionToken[^>]*?(?:/>|>([^<]*)</resumptionToken>)")
+
+
+# 解析时用到的限定名都预先拼好，热路径上只做字符串比较和字典查找
+_RECORD = f"{OAI}record"
+_METADATA = f"{OAI}metadata"
+_RESUMPTION_TOKEN = f"{OAI}resumptionToken"
+_ERROR = f"{OAI}error"
+_AUTHORS = f"{ARXIV}authors"
+# arXiv 元素的子元素 -> 在 Paper 字段里的位置；id 在 XML 里叫 id，记录里叫 arxiv_id
+_FIELD_INDEX = {f"{ARXIV}{'id' if field == 'arxiv_id' else field}": i for i, field in enumerate(PAPER_FIELDS)}
+_AUTHORS_INDEX = PAPER_FIELDS.index("authors")
+# 作者名按 forenames keyname suffix 的顺序拼接，与它们在 XML 里出现的顺序无关
+_NAME_PART_INDEX = {f"{ARXIV}forenames": 0, f"{ARXIV}keyname": 1, f"{ARXIV}suffix": 2}
+
+
+def parse_author(author):
+    parts = [None, None, None]
+    for part in author:
+        i = _NAME_PART_INDEX.get(part.tag)
+        if i is not None and part.text:
+            parts[i] = part.text.strip()
+    return " ".join(part for part in parts if part)
+
+
+def parse_arxiv_metadata(metadata):
+    # 只遍历一遍 arXiv 元素的直接子元素，不再对每个字段各做一次 find
+    values = [None] * len(PAPER_FIELDS)
+    values[_AUTHORS_INDEX] = []
+    for child in metadata:
+        tag = child.tag
+        if tag == _AUTHORS:
+            values[_AUTHORS_INDEX] = [parse_author(author) for author in child]
+            continue
+        i = _FIELD_INDEX.get(tag)
+        if i is not None and child.text is not None:
+            values[i] = child.text.strip()
+    return Paper(*values)
+
+
+class ListRecordsParser:
+    # 增量解析一页 ListRecords 响应：每个 record 解析完立即产出并释放，不保留整棵树
+    def __init__(self):
+        self.records = 0
+        self.resumption_token = None
+        self.complete_list_size = None
+        self.error = None
+
+    def parse(self, chunks):
+        # 只订阅 end 事件，事件数减半；解析完的 record 会被清空，留在 ListRecords 下的空壳每页不过几千个
+        parser = ET.XMLPullParser(events=("end",))
+        for chunk in chunks:
+            METRICS.inc("bytes_in_total", len(chunk), endpoint="oai")
+            parser.feed(chunk)
+            yield from self._drain(parser)
+        parser.close()
+        yield from self._drain(parser)
+
+    def _drain(self, parser):
+        for _, elem in parser.read_events():
+            tag = elem.tag
+            if tag == _RECORD:
+                self.records += 1
+                # record 下是 header 和 metadata，metadata 下只有一个 arXiv 元素；已删除的记录没有 metadata
+                paper = None
+                for child in elem:
+                    if child.tag == _METADATA and len(child):
+                        paper = parse_arxiv_metadata(child[0])
+                elem.clear()
+                if paper is not None:
+                    yield paper
+            elif tag == _RESUMPTION_TOKEN:
+                if elem.text and elem.text.strip():
+                    self.resumption_token = elem.text.strip()
+                if elem.get("completeListSize"):
+                    self.complete_list_size = int(elem.get("completeListSize"))
+            elif tag == _ERROR:
+                self.error = (elem.get("code"), (elem.text or "").strip())
+
+
+def fetch_page(session, params, max_retries=5):
+    for _ in range(max_retries):
+        # 计时到响应头为止，正文是流式读取的，读正文的时间算在解析里
+        with METRICS.timer("http_request_seconds", endpoint="oai"):
+            response = session.get(BASE_URL, params=params, stream=True, timeout=120)
+        METRICS.inc("http_responses_total", endpoint="oai", status=response.status_code)
+        if response.status_code == 503:
+            # arXiv 的 OAI 接口限流时返回 503 + Retry-After
+            try:
+                wait = int(response.headers.get("Retry-After", 30))
+            except ValueError:
+                wait = 30
+            response.close()
+            print(f"Server busy, retrying in {wait} seconds")
+            METRICS.inc("http_retries_total", endpoint="oai")
+            METRICS.inc("rate_limited_seconds_total", wait, endpoint="oai")
+            time.sleep(wait)
+            continue
+        response.raise_for_status()
+        return response
+    raise RuntimeError(f"Giving up on {BASE_URL} after {max_retries} attempts")
+
+
+def _serial_pages(session, params, limiter):
+    while True:
+        page = ListRecordsParser()
+        METRICS.inc("rate_limited_seconds_total", limiter.acquire(), endpoint="oai")
+        with fetch_page(session, params) as response:
+            yield page, response.iter_content(chunk_size=64 * 1024)
+
+        if page.resumption_token is None:
+            return
+
+        params = {"verb": "ListRecords", "resumptionToken": page.resumption_token}
+
+
+def _peek_resumption_token(content):
+    start = content.rfind(b"<resumptionToken")
+    if start == -1:
+        return None
+    match = _TOKEN_RE.match(content, start)
+    if match is None or not match.group(1) or not match.group(1).strip():
+        return None
+    return unescape(match.group(1).strip().decode("utf-8"))
+
+
+def _prefetch_pages(session, params, limiter, pages, stop):
+    # 后台线程：拿到本页的 resumptionToken 后，在限流允许的最早时刻请求下一页
+    try:
+        while params is not None and not stop.is_set():
+            METRICS.inc("rate_limited_seconds_total", limiter.acquire(), endpoint="oai")
+            with fetch_page(session, params) as response:
+                content = response.content
+
+            token = _peek_resumption_token(content)
+            params = {"verb": "ListRecords", "resumptionToken": token} if token else None
+            _put_until_stopped(pages, content, stop)
+    except Exception as e:
+        _put_until_stopped(pages, e, stop)
+    _put_until_stopped(pages, None, stop)
+
+
+def _put_until_stopped(pages, item, stop):
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _pipelined_pages(session, params, limiter, max_pending=2):
+    pages = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    fetcher = threading.Thread(target=_prefetch_pages, args=(session, params, limiter, pages, stop), daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            METRICS.gauge("queue_depth", pages.qsize(), queue="oai_pages")
+            item = pages.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield ListRecordsParser(), [item]
+    finally:
+        stop.set()
+
+
+def harvest(start_date, end_date, subject, until_padding=2, delay=2, session=None, pipelined=False, checkpoint=None,
+            limiter=None, window=None, progress=True, filter_created=True):
+    # 按 created 落在 [start_date, end_date] 过滤；OAI 请求的 from/until 是按记录修改日期（datestamp）算的，
+    # 默认为 [start_date, end_date + until_padding]，分片抓取时用 window=(from, until) 只请求其中一段
+    # filter_created=False 时不按 created 过滤，返回这段时间内有改动的所有记录（增量同步用）
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if session is None:
+        session = requests.Session()
+    if limiter is None:
+        # 相邻两次请求的开始时间至少间隔 delay 秒
+        limiter = TokenBucket(1.0 / delay if delay else None, capacity=1)
+    if window is None:
+        window = (start.strftime("%Y-%m-%d"), (end + timedelta(days=until_padding)).strftime("%Y-%m-%d"))
+
+    params = {
+        "verb": "ListRecords",
+        "metadataPrefix": "arXiv",
+        "from": window[0],
+        "until": window[1],
+        "set": subject
+    }
+    if checkpoint is not None and checkpoint.resumed:
+        if checkpoint.done:
+            print("Checkpoint says this harvest already finished, nothing to fetch")
+            return
+        params = {"verb": "ListRecords", "resumptionToken": checkpoint.token}
+
+    processed_records = 0
+    filtered_records = 0
+
+    print(f"Fetching papers for {subject} from {start.date()} to {end.date()} (datestamps {window[0]} to {window[1]})")
+
+    if pipelined:
+        pages = _pipelined_pages(session, params, limiter)
+    else:
+        pages = _serial_pages(session, params, limiter)
+
+    # created 是 YYYY-MM-DD，直接按字符串比较，不必每条记录都 strptime
+    first_day, last_day = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    with tqdm(total=None, desc="Fetching papers", unit="record", disable=not progress) as pbar:
+        for page, chunks in pages:
+            for paper in page.parse(chunks):
+                if not filter_created or first_day <= paper.created <= last_day:
+                    filtered_records += 1
+                    yield paper
+
+            if page.error is not None and page.error[0] != "noRecordsMatch":
+                raise RuntimeError(f"OAI-PMH error {page.error[0]}: {page.error[1]}")
+
+            processed_records += page.records
+            METRICS.inc("records_total", page.records, stage="harvest", outcome="processed")
+            METRICS.inc("pages_total", stage="harvest")
+            if pbar.total is None and page.complete_list_size is not None:
+                pbar.total = page.complete_list_size
+            pbar.update(page.records)
+            pbar.set_postfix(kept=filtered_records)
+
+            # 本页记录都已被下游写出，此时落盘断点
+            if checkpoint is not None:
+                checkpoint.commit(page.resumption_token)
+
+    METRICS.inc("records_total", filtered_records, stage="harvest", outcome="kept")
+    print(f"\nFetched {filtered_records} papers within the specified date range out of {processed_records} total records")
+
+
+def save_to_jsonl(papers, filename, checkpoint=None):
+    print(f"Saving papers to {filename}")
+    count = write_papers(papers, JsonlSink(filename, checkpoint))
+    print(f"Save completed: {count} papers")
+    return count
+
+
+def read_jsonl(filename):
+    with open(filename, encoding='utf-8') as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json.loads(line)
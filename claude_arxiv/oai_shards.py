@@ -0,0 +1,93 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from tqdm import tqdm
+from oai_harvest import harvest, save_to_jsonl, read_jsonl
+from sinks import write_papers
+from rate_limit import SharedIntervalLimiter
+
+_limiter = None
+
+
+def split_range(start_date, end_date, days):
+    # 把 [start_date, end_date] 切成互不重叠的窗口，OAI 的 from/until 两端都是闭区间
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    windows = []
+    while start <= end:
+        window_end = min(start + timedelta(days=days - 1), end)
+        windows.append((start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+def _init_worker(limiter):
+    global _limiter
+    _limiter = limiter
+
+
+def _harvest_shard(start_date, end_date, subject, window, shard_path):
+    # 已经完成的分片留有 .done 标记，重跑时直接跳过
+    done_path = f"{shard_path}.done"
+    if os.path.exists(done_path):
+        with open(done_path, encoding='utf-8') as f:
+            return shard_path, json.load(f)["records"]
+
+    papers = harvest(start_date, end_date, subject, window=window, limiter=_limiter, progress=False)
+    count = save_to_jsonl(papers, shard_path)
+    with open(done_path, 'w', encoding='utf-8') as f:
+        json.dump({"records": count}, f)
+    return shard_path, count
+
+
+def harvest_sharded(start_date, end_date, subject, filename, shard_days=7, processes=4, delay=2, until_padding=2, sink=None):
+    # 按 datestamp 把请求区间切片后交给进程池并行抓取，所有进程共用一个限速器，
+    # 上游的请求速率始终不超过每 delay 秒一次；解析、过滤和序列化分摊到多个核上
+    # 每个分片都按整个 [start_date, end_date] 过滤 created，合并时按 arxiv_id 去重
+    # 分片本身总是 JSONL；sink 为空时合并结果写到 filename，否则写进给定的输出后端
+    oai_until = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=until_padding)).strftime("%Y-%m-%d")
+    windows = split_range(start_date, oai_until, shard_days)
+    shard_dir = f"{filename}.shards"
+    os.makedirs(shard_dir, exist_ok=True)
+
+    print(f"Harvesting {subject} in {len(windows)} shards of {shard_days} days with {processes} processes")
+    limiter = SharedIntervalLimiter(delay)
+    shard_paths = []
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(limiter,)) as executor:
+        futures = []
+        for window in windows:
+            shard_path = os.path.join(shard_dir, f"{window[0]}_{window[1]}.jsonl")
+            shard_paths.append(shard_path)
+            futures.append(executor.submit(_harvest_shard, start_date, end_date, subject, window, shard_path))
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Harvesting shards", unit="shard"):
+            future.result()
+
+    return merge_shards(shard_paths, filename, sink)
+
+
+def merge_shards(shard_paths, filename, sink=None):
+    # 同一篇论文出现在多个窗口时保留最后一个窗口里的那份，它的 datestamp 最新，是较新的版本
+    # 先扫一遍记下每个 arxiv_id 最后出现在哪个分片，再按原顺序输出，结果仍按窗口先后排列
+    last_shard = {}
+    for index, shard_path in enumerate(shard_paths):
+        for paper in read_jsonl(shard_path):
+            last_shard[paper["arxiv_id"]] = index
+    duplicates = 0
+
+    def unique_papers():
+        nonlocal duplicates
+        for index, shard_path in enumerate(shard_paths):
+            for paper in read_jsonl(shard_path):
+                if last_shard.get(paper["arxiv_id"]) != index:
+                    duplicates += 1
+                    continue
+                del last_shard[paper["arxiv_id"]]
+                yield paper
+
+    if sink is None:
+        count = save_to_jsonl(unique_papers(), filename)
+    else:
+        count = write_papers(unique_papers(), sink)
+    print(f"Merged {len(shard_paths)} shards, dropped {duplicates} duplicate records")
+    return count
@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import sqlite3
+import zlib
+
+from records import as_dict
+
+# 标题和摘要按字母数字切词；停用词几乎出现在每篇论文里，既占空间又不能缩小结果，不进索引
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be been but by can for from has have in into is it its of on or our over than that the
+    their these this those to via we which while with
+""".split())
+# 估计各个条件的结果数时最多数到这里，够挑出最短的列表，又不会在常见词上数很久
+PROBE_LIMIT = 10000
+
+
+def tokenize(text):
+    return {token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS}
+
+
+def paper_terms(paper):
+    return tokenize(f"{paper.get('title') or ''} {paper.get('abstract') or ''}")
+
+
+def paper_categories(paper):
+    categories = paper.get("categories") or []
+    return categories.split() if isinstance(categories, str) else categories
+
+
+def normalize_author(name):
+    return " ".join(name.lower().split())
+
+
+class PaperIndex:
+    # harvest 结果的本地索引（SQLite）：postings 是标题和摘要的倒排表，doc_categories、doc_authors
+    # 和 docs 上的 created 索引是按分类、作者、日期的有序二级索引，都以 (键, doc_id) 为主键，查一个键就是一段有序区间
+    # docs 里存整条记录，查询时不用回去读 JSONL；sources 记录每个 JSONL 文件已经读到的字节位置和这段前缀的 CRC32，
+    # 新追加的批次只索引新增的行，同一 arxiv_id 再次出现且内容有变时替换旧记录
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                arxiv_id TEXT NOT NULL UNIQUE,
+                created TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_created ON docs (created);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS doc_categories (
+                category TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (category, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS doc_authors (
+                author TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                PRIMARY KEY (author, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                checksum INTEGER
+            );
+        """)
+        # 旧版建的 sources 没有 checksum 列；补上后旧行是 NULL，下次会从头读一遍
+        if "checksum" not in {row[1] for row in self.conn.execute("PRAGMA table_info(sources)")}:
+            self.conn.execute("ALTER TABLE sources ADD COLUMN checksum INTEGER")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    @staticmethod
+    def _keys(paper, doc_id):
+        return ([(term, doc_id) for term in paper_terms(paper)],
+                [(category, doc_id) for category in set(paper_categories(paper))],
+                [(author, doc_id) for author in {normalize_author(name) for name in paper.get("authors") or []}])
+
+    def _add_batch(self, papers, source=None):
+        # 一批记录和 sources 里的读取位置在同一个事务里提交，中断后不会漏行也不会重复
+        latest = {paper["arxiv_id"]: paper for paper in map(as_dict, papers)}
+        existing = {}
+        ids = list(latest)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT arxiv_id, doc_id, record FROM docs WHERE arxiv_id IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update((arxiv_id, (doc_id, record)) for arxiv_id, doc_id, record in rows)
+
+        added = replaced = 0
+        stale = ([], [], [])
+        fresh = ([], [], [])
+        with self.conn:
+            for arxiv_id, paper in latest.items():
+                record = json.dumps(paper, ensure_ascii=False)
+                if arxiv_id in existing:
+                    doc_id, old_record = existing[arxiv_id]
+                    if old_record == record:
+                        continue
+                    for rows, keys in zip(stale, self._keys(json.loads(old_record), doc_id)):
+                        rows.extend(keys)
+                    self.conn.execute("UPDATE docs SET created = ?, record = ? WHERE doc_id = ?",
+                                      (paper.get("created"), record, doc_id))
+                    replaced += 1
+                else:
+                    doc_id = self.conn.execute("INSERT INTO docs (arxiv_id, created, record) VALUES (?, ?, ?)",
+                                               (arxiv_id, paper.get("created"), record)).lastrowid
+                    added += 1
+                for rows, keys in zip(fresh, self._keys(paper, doc_id)):
+                    rows.extend(keys)
+
+            # 按主键排好序再写，B 树上是顺序插入
+            for table, key, rows in zip(("postings", "doc_categories", "doc_authors"), ("term", "category", "author"), stale):
+                self.conn.executemany(f"DELETE FROM {table} WHERE {key} = ? AND doc_id = ?", rows)
+            for table, key, rows in zip(("postings", "doc_categories", "doc_authors"), ("term", "category", "author"), fresh):
+                rows.sort()
+                self.conn.executemany(f"INSERT OR IGNORE INTO {table} ({key}, doc_id) VALUES (?, ?)", rows)
+            if source is not None:
+                self.conn.execute("INSERT OR REPLACE INTO sources (path, offset, checksum) VALUES (?, ?, ?)", source)
+        return added, replaced
+
+    def add_papers(self, papers):
+        # 返回 (新增数, 替换数)
+        added = replaced = 0
+        batch = []
+        for paper in papers:
+            batch.append(paper)
+            if len(batch) >= self.batch_size:
+                counts = self._add_batch(batch)
+                added, replaced = added + counts[0], replaced + counts[1]
+                batch = []
+        if batch:
+            counts = self._add_batch(batch)
+            added, replaced = added + counts[0], replaced + counts[1]
+        return added, replaced
+
+    @staticmethod
+    def _prefix_checksum(f, size):
+        # 文件开头 size 字节的 CRC32；不够 size 字节时返回 None
+        checksum = 0
+        remaining = size
+        while remaining:
+            block = f.read(min(remaining, 1024 * 1024))
+            if not block:
+                return None
+            checksum = zlib.crc32(block, checksum)
+            remaining -= len(block)
+        return checksum
+
+    def add_jsonl(self, path):
+        # 从上次读到的位置继续，只读完整的行：正在写的文件最后半行留到下次
+        # harvest 脚本都是用 'w' 重写输出文件的，大小和 inode 都可能不变，所以每次先核对已读前缀的 CRC32：
+        # 对不上（或文件变短了）说明被重写过，从头再读一遍，没变的记录会被跳过。核对要顺序读一遍前缀，
+        # 比解析 JSON 和写索引便宜得多
+        key = os.path.abspath(path)
+        row = self.conn.execute("SELECT offset, checksum FROM sources WHERE path = ?", (key,)).fetchone()
+        offset, checksum = row if row else (0, 0)
+
+        added = replaced = 0
+        batch = []
+        with open(path, "rb") as f:
+            if offset and self._prefix_checksum(f, offset) != checksum:
+                offset, checksum = 0, 0
+                f.seek(0)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                checksum = zlib.crc32(line, checksum)
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= self.batch_size:
+                    counts = self._add_batch(batch, (key, offset, checksum))
+                    added, replaced = added + counts[0], replaced + counts[1]
+                    batch = []
+        counts = self._add_batch(batch, (key, offset, checksum))
+        return added + counts[0], replaced + counts[1]
+
+    def _conditions(self, query, categories, authors, since, until):
+        # 每个条件给出两种写法：单独列出满足它的 doc_id（驱动查询用），以及对 docs 里某一行的探测（过滤用）
+        conditions = []
+        for term in sorted(tokenize(query or "")):
+            conditions.append(("SELECT doc_id FROM postings WHERE term = ?",
+                               "EXISTS (SELECT 1 FROM postings WHERE term = ? AND doc_id = d.doc_id)", [term]))
+        if categories:
+            marks = ",".join("?" * len(categories))
+            conditions.append((f"SELECT DISTINCT doc_id FROM doc_categories WHERE category IN ({marks})",
+                               f"EXISTS (SELECT 1 FROM doc_categories WHERE category IN ({marks}) AND doc_id = d.doc_id)",
+                               list(categories)))
+        for author in authors or ():
+            # 作者按规范化后的全名前缀匹配，例如 "geoffrey" 或 "geoffrey e. hinton"
+            prefix = normalize_author(author)
+            conditions.append(("SELECT DISTINCT doc_id FROM doc_authors WHERE author >= ? AND author < ?",
+                               "EXISTS (SELECT 1 FROM doc_authors WHERE author >= ? AND author < ? AND doc_id = d.doc_id)",
+                               [prefix, prefix + "\uffff"]))
+        if since or until:
+            dates, params = [], []
+            if since:
+                dates.append("d.created >= ?")
+                params.append(since)
+            if until:
+                dates.append("d.created <= ?")
+                params.append(until)
+            conditions.append((None, " AND ".join(dates), params))
+        return conditions
+
+    def _estimate(self, condition):
+        driver, probe, params = condition
+        if driver is None:
+            driver = f"SELECT doc_id FROM docs d WHERE {probe}"
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({driver} LIMIT {PROBE_LIMIT})", params).fetchone()[0]
+
+    def search(self, query="", categories=(), authors=(), since=None, until=None, limit=20):
+        # 词之间、不同作者之间是“且”，categories 之间是“或”；since/until 按 created 闭区间过滤；结果按 created 从新到旧
+        # 先数一下每个条件大约命中多少（数到 PROBE_LIMIT 为止），用最短的列表驱动查询，其余条件按主键逐条探测，
+        # 代价只和最短的列表成正比，不会扫全表
+        # 估计值相同（都数到了上限）时优先用日期区间驱动，沿索引扫到够数就停
+        # query 里只有停用词或单个字符时没有可用的词，返回空结果，而不是退化成不带词条件的查询
+        if query and not tokenize(query):
+            return []
+        conditions = sorted(self._conditions(query, categories, authors, since, until),
+                            key=lambda condition: (self._estimate(condition), condition[0] is not None))
+        where, params = [], []
+        if not conditions or conditions[0][0] is None:
+            # 没有条件或日期区间最窄：沿 created 索引从新到旧扫，凑够 limit 条就停，不用排序
+            sql = "SELECT d.record FROM docs d"
+            probes = conditions
+        else:
+            # CROSS JOIN 让 SQLite 保持这里选定的连接顺序
+            driver, _, params = conditions[0]
+            sql = f"SELECT d.record FROM ({driver}) AS c CROSS JOIN docs d"
+            where.append("d.doc_id = c.doc_id")
+            probes = conditions[1:]
+        for _, probe, probe_params in probes:
+            where.append(probe)
+            params = params + probe_params
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY d.created DESC, d.doc_id DESC LIMIT ?"
+        rows = self.conn.execute(sql, params + [-1 if limit is None else limit])
+        return [json.loads(record) for (record,) in rows]
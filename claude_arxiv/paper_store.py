@@ -0,0 +1,96 @@
+import json
+import sqlite3
+
+from records import as_dict
+
+
+class PaperStore:
+    # 持久化的元数据仓库（SQLite）：papers 以 (arxiv_id, version) 为主键，主键索引就是磁盘上的去重索引；
+    # sync_state 记录每个 set 上次同步到的日期（high-water mark）
+    # arXiv 元数据格式里没有版本号，用 updated（没有则 created）日期代表版本
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                created TEXT,
+                categories TEXT,
+                record TEXT NOT NULL,
+                PRIMARY KEY (arxiv_id, version)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sync_state (
+                set_spec TEXT PRIMARY KEY,
+                high_water TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def high_water(self, set_spec):
+        row = self.conn.execute("SELECT high_water FROM sync_state WHERE set_spec = ?", (set_spec,)).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, set_spec, datestamp):
+        self.conn.execute(
+            "INSERT INTO sync_state (set_spec, high_water) VALUES (?, ?) "
+            "ON CONFLICT(set_spec) DO UPDATE SET high_water = excluded.high_water",
+            (set_spec, datestamp))
+        self.conn.commit()
+
+    def upsert(self, papers, batch_size=500):
+        # 分批写入，同一 (arxiv_id, version) 再次出现且内容有变时覆盖旧记录；返回 (新增数, 更新数)
+        # 重叠的那一天里没变的记录不写也不计数
+        inserted = updated = 0
+        batch = []
+        for paper in papers:
+            batch.append((paper["arxiv_id"], paper.get("updated") or paper["created"], paper["created"],
+                          paper["categories"], json.dumps(as_dict(paper), ensure_ascii=False)))
+            if len(batch) >= batch_size:
+                counts = self._write_batch(batch)
+                inserted, updated = inserted + counts[0], updated + counts[1]
+                batch = []
+        if batch:
+            counts = self._write_batch(batch)
+            inserted, updated = inserted + counts[0], updated + counts[1]
+        return inserted, updated
+
+    def _write_batch(self, batch):
+        # 先按主键查出库里已有的记录，新记录只 INSERT，已有且内容不同的只 UPDATE，每行最多写一次
+        latest = {(row[0], row[1]): row for row in batch}
+        ids = sorted({arxiv_id for arxiv_id, _ in latest})
+        existing = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT arxiv_id, version, record FROM papers WHERE arxiv_id IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update(((arxiv_id, version), record) for arxiv_id, version, record in rows)
+
+        inserts = [row for key, row in latest.items() if key not in existing]
+        updates = [(created, categories, record, arxiv_id, version)
+                   for (arxiv_id, version, created, categories, record) in latest.values()
+                   if (arxiv_id, version) in existing and existing[arxiv_id, version] != record]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO papers (arxiv_id, version, created, categories, record) VALUES (?, ?, ?, ?, ?)",
+                inserts)
+            self.conn.executemany(
+                "UPDATE papers SET created = ?, categories = ?, record = ? WHERE arxiv_id = ? AND version = ?",
+                updates)
+        return len(inserts), len(updates)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(DISTINCT arxiv_id) FROM papers").fetchone()[0]
+
+    def iter_latest(self):
+        # 每篇论文只取最新版本
+        cursor = self.conn.execute(
+            "SELECT record FROM papers p WHERE version = "
+            "(SELECT MAX(version) FROM papers WHERE arxiv_id = p.arxiv_id) ORDER BY arxiv_id")
+        for (record,) in cursor:
+            yield json.loads(record)
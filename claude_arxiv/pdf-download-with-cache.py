@@ -1,129 +1,39 @@
-import xml.etree.ElementTree as ET
-import requests
+import argparse
 import time
-import json
 import os
-import shutil
 from tqdm import tqdm
-from datetime import datetime, timedelta
+from checkpoint import HarvestCheckpoint
+from metrics import METRICS, add_metrics_arguments, configure_metrics, write_metrics
+from oai_harvest import harvest, save_to_jsonl, read_jsonl
+from pdf_download import PdfDownloader
+from pdf_store import PdfStore, safe_id
 
-def fetch_arxiv_data(start_date, end_date, subject):
-    base_url = "http://export.arxiv.org/oai2"
-    
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    end_date_param = (end_date + timedelta(days=2)).strftime("%Y-%m-%d")
-    
-    params = {
-        "verb": "ListRecords",
-        "metadataPrefix": "arXiv",
-        "from": start_date.strftime("%Y-%m-%d"),
-        "until": end_date_param,
-        "set": f"{subject}"
-    }
-    
-    papers = []
-    total_records = 0
-    processed_records = 0
-    filtered_records = 0
-    
-    print(f"Fetching papers for {subject} from {start_date.date()} to {end_date.date()}")
-    
-    with tqdm(total=None, desc="Fetching papers", unit="paper") as pbar:
-        while True:
-            response = requests.get(base_url, params=params)
-            root = ET.fromstring(response.content)
-            
-            if total_records == 0:
-                total_records_elem = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken[@completeListSize]")
-                if total_records_elem is not None:
-                    total_records = int(total_records_elem.attrib['completeListSize'])
-                    pbar.total = total_records
-                    pbar.refresh()
-            
-            records = root.findall(".//{http://www.openarchives.org/OAI/2.0/}record")
-            for record in records:
-                metadata = record.find(".//{http://arxiv.org/OAI/arXiv/}arXiv")
-                if metadata is not None:
-                    created_date = datetime.strptime(metadata.find("{http://arxiv.org/OAI/arXiv/}created").text.strip(), "%Y-%m-%d")
-                    if start_date <= created_date <= end_date:
-                        paper = {
-                            "title": metadata.find("{http://arxiv.org/OAI/arXiv/}title").text.strip(),
-                            "authors": [author.text.strip() for author in metadata.findall("{http://arxiv.org/OAI/arXiv/}authors/{http://arxiv.org/OAI/arXiv/}author/{http://arxiv.org/OAI/arXiv/}name")],
-                            "abstract": metadata.find("{http://arxiv.org/OAI/arXiv/}abstract").text.strip(),
-                            "categories": metadata.find("{http://arxiv.org/OAI/arXiv/}categories").text.strip(),
-                            "created": created_date.strftime("%Y-%m-%d"),
-                            "doi": metadata.find("{http://arxiv.org/OAI/arXiv/}doi").text.strip() if metadata.find("{http://arxiv.org/OAI/arXiv/}doi") is not None else None,
-                            "arxiv_id": metadata.find("{http://arxiv.org/OAI/arXiv/}id").text.strip()
-                        }
-                        papers.append(paper)
-                        filtered_records += 1
-                        pbar.update(1)
-                processed_records += 1
-            
-            resumption_token = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken")
-            if resumption_token is None or resumption_token.text is None:
-                break
-            
-            params = {"verb": "ListRecords", "resumptionToken": resumption_token.text}
-            
-            time.sleep(2)
-    
-    print(f"\nFetched {filtered_records} papers within the specified date range out of {processed_records} total records")
-    return papers
-
-def save_to_jsonl(papers, filename):
-    print(f"Saving {len(papers)} papers to {filename}")
-    with open(filename, 'w', encoding='utf-8') as jsonl_file:
-        for paper in papers:
-            json.dump(paper, jsonl_file, ensure_ascii=False)
-            jsonl_file.write('\n')
-    print(f"Save completed")
-
-def download_pdf(arxiv_id, output_folder):
-    output_path = os.path.join(output_folder, f"{arxiv_id}.pdf")
+# Shared with the fine-grained script so a paper is only ever stored once
+PDF_STORE_DIR = os.environ.get("ARXIV_PDF_STORE", "arxiv_pdf_store")
 
-    # 检查文件是否已存在
-    if os.path.exists(output_path):
-        return True, True  # 文件存在，表示使用了缓存
+def fetch_arxiv_data(start_date, end_date, subject, checkpoint=None):
+    return harvest(start_date, end_date, subject, until_padding=2, pipelined=True, checkpoint=checkpoint)
 
-    pdf_url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-    
-    try:
-        response = requests.get(pdf_url, stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        
-        return True, False  # 下载成功，但不是使用缓存
-    except requests.RequestException as e:
-        print(f"Error downloading {arxiv_id}: {e}")
-        return False, False  # 下载失败，不是使用缓存
-
-def organize_pdfs_by_category(papers, base_folder):
+def organize_pdfs_by_category(papers, store, base_folder, total=None):
+    # 分类目录里只放指向 PDF 仓库的链接，跨分类的论文也只存一份；已有的链接不会重复建立
     print("\nOrganizing PDFs by category...")
-    for paper in tqdm(papers, desc="Organizing PDFs", unit="paper"):
+    linked = 0
+    for paper in tqdm(papers, total=total, desc="Organizing PDFs", unit="paper"):
         arxiv_id = paper['arxiv_id']
         categories = paper['categories'].split()
-        source_file = os.path.join(base_folder, f"{arxiv_id}.pdf")
         
-        if not os.path.exists(source_file):
+        if not store.has(arxiv_id):
             print(f"Warning: PDF for {arxiv_id} not found. Skipping.")
             continue
         
+        filename = f"{safe_id(arxiv_id)}.pdf"
+        linked += store.link(arxiv_id, os.path.join(base_folder, filename))
         for category in categories:
-            category_folder = os.path.join(base_folder, category)
-            if not os.path.exists(category_folder):
-                os.makedirs(category_folder)
-            
-            dest_file = os.path.join(category_folder, f"{arxiv_id}.pdf")
-            shutil.copy2(source_file, dest_file)
+            linked += store.link(arxiv_id, os.path.join(base_folder, category, filename))
     
-    print("PDF organization completed.")
+    print(f"PDF organization completed, {linked} links created or updated.")
 
-def main():
+def main(args):
     start_date = "2024-08-05"
     end_date = "2024-08-05"
     subject = "cs"  # For computer science
@@ -133,40 +43,55 @@ def main():
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
+    # Stream metadata straight into the JSONL file while harvesting
+    filename = f'arxiv_{subject}_{start_date}_to_{end_date}.jsonl'
+    checkpoint = HarvestCheckpoint(f"{filename}.checkpoint", {"start_date": start_date, "end_date": end_date, "subject": subject})
+    if args.resume:
+        checkpoint.load()
+    configure_metrics(args)
     start_time = time.time()
-    papers = fetch_arxiv_data(start_date, end_date, subject)
+    with METRICS.stage("harvest"):
+        num_papers = save_to_jsonl(fetch_arxiv_data(start_date, end_date, subject, checkpoint), filename, checkpoint)
     end_time = time.time()
     
     print(f"\nTime taken to fetch papers: {end_time - start_time:.2f} seconds")
     
-    # Save metadata to JSONL file
-    filename = f'arxiv_{subject}_{start_date}_to_{end_date}.jsonl'
-    save_to_jsonl(papers, filename)
-    
-    # Download PDFs
-    print(f"\nDownloading PDFs for {len(papers)} papers")
+    # Download PDFs, reading the papers back from disk instead of keeping them in memory
+    print(f"\nDownloading PDFs for {num_papers} papers")
     successful_downloads = 0
     cached_downloads = 0
-    with tqdm(total=len(papers), desc="Downloading PDFs", unit="pdf") as pbar:
-        for paper in papers:
-            success, used_cache = download_pdf(paper['arxiv_id'], output_folder)
+    # Downloads run on a worker pool sharing one session; the rate limit is global, not per worker
+    store = PdfStore(PDF_STORE_DIR)
+    # PDFs downloaded into output_folder by older versions of this script go into the store without a request
+    imported = store.import_pdf_dir(output_folder)
+    if imported:
+        print(f"Imported {imported} existing PDFs from {output_folder} into {PDF_STORE_DIR}")
+    downloader = PdfDownloader(store, workers=8, requests_per_second=1.0)
+    arxiv_ids = (paper['arxiv_id'] for paper in read_jsonl(filename))
+    with METRICS.stage("download"), tqdm(total=num_papers, desc="Downloading PDFs", unit="pdf") as pbar:
+        for _, success, used_cache in downloader.download_all(arxiv_ids):
             if success:
                 successful_downloads += 1
                 if used_cache:
                     cached_downloads += 1
             pbar.update(1)
-            if not used_cache:
-                time.sleep(1)  # Be nice to the arXiv servers, but only if we actually downloaded
     
-    print(f"\nSuccessfully downloaded or found {successful_downloads} out of {len(papers)} PDFs")
+    print(f"\nSuccessfully downloaded or found {successful_downloads} out of {num_papers} PDFs")
     print(f"Used existing files for {cached_downloads} PDFs")
     
     # Organize PDFs by category
-    organize_pdfs_by_category(papers, output_folder)
+    with METRICS.stage("organize"):
+        organize_pdfs_by_category(read_jsonl(filename), store, output_folder, total=num_papers)
     
-    print(f"\nTotal papers fetched and saved: {len(papers)}")
-    print(f"PDFs saved in folder: {output_folder}")
-    print("PDFs have been organized into category subfolders within the main folder.")
+    print(f"\nTotal papers fetched and saved: {num_papers}")
+    print(f"PDFs stored once in: {PDF_STORE_DIR}")
+    print(f"PDFs linked into category subfolders of: {output_folder}")
+    write_metrics(args)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted harvest from its checkpoint file')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,120 @@
+import os
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from metrics import METRICS
+from rate_limit import TokenBucket
+from pdf_store import parse_version, InvalidPdfError
+
+PDF_URL = os.environ.get("ARXIV_PDF_URL", "https://arxiv.org/pdf/{arxiv_id}.pdf")
+CHUNK_SIZE = 64 * 1024
+
+
+def make_session(pool_size):
+    # 所有下载线程共用一个 Session，连接池大小与线程数一致，保持 keep-alive
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class PdfDownloader:
+    # revalidate=False 时已在仓库里且大小对得上的 PDF 直接算命中，完全不访问网络；
+    # revalidate=True 时用 If-None-Match / If-Modified-Since 向服务器确认是否有更新
+    def __init__(self, store, workers=4, requests_per_second=1.0, bytes_per_second=None, revalidate=False):
+        self.store = store
+        self.workers = workers
+        self.revalidate = revalidate
+        self.session = make_session(workers)
+        self.request_limiter = TokenBucket(requests_per_second)
+        self.byte_limiter = TokenBucket(bytes_per_second, capacity=max(bytes_per_second or 0, CHUNK_SIZE))
+
+    def _chunks(self, response):
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            METRICS.inc("rate_limited_seconds_total", self.byte_limiter.acquire(len(chunk)), endpoint="pdf", limit="bytes")
+            METRICS.inc("bytes_in_total", len(chunk), endpoint="pdf")
+            yield chunk
+
+    def _request_headers(self, arxiv_id, cached):
+        headers = {}
+        entry = self.store.get(arxiv_id)
+        if cached:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            return headers
+
+        # 上次下到一半：带上 Range 续传，If-Range 保证服务器上的文件没变过，否则会返回完整的 200
+        partial = self.store.partial(arxiv_id)
+        if partial is not None and partial[0] > 0:
+            size, info = partial
+            validator = info.get("etag") or info.get("last_modified")
+            if validator:
+                headers["Range"] = f"bytes={size}-"
+                headers["If-Range"] = validator
+        return headers
+
+    def download(self, arxiv_id):
+        # 检查 PDF 是否已在仓库中
+        cached = self.store.has(arxiv_id)
+        if cached and not self.revalidate:
+            METRICS.inc("pdf_downloads_total", outcome="cached")
+            return True, True  # 文件存在，表示使用了缓存
+
+        headers = self._request_headers(arxiv_id, cached)
+        METRICS.inc("rate_limited_seconds_total", self.request_limiter.acquire(), endpoint="pdf", limit="requests")
+        start = time.perf_counter()
+        try:
+            with self.session.get(PDF_URL.format(arxiv_id=arxiv_id), headers=headers, stream=True, timeout=60) as response:
+                METRICS.inc("http_responses_total", endpoint="pdf", status=response.status_code)
+                if response.status_code == 304:
+                    METRICS.inc("pdf_downloads_total", outcome="not_modified")
+                    return True, True  # 服务器确认没有变化
+                if response.status_code == 416 and "Range" in headers:
+                    # .part 已经下完整了（上次写完后、rename 前中断），服务器没有剩下的字节可给
+                    complete = True
+                else:
+                    complete = False
+                    response.raise_for_status()
+                    self.store.add(arxiv_id, self._chunks(response),
+                                   version=parse_version(response),
+                                   etag=response.headers.get("ETag"),
+                                   last_modified=response.headers.get("Last-Modified"),
+                                   resume=response.status_code == 206)
+            if complete:
+                try:
+                    self.store.finish_partial(arxiv_id)
+                except InvalidPdfError:
+                    # 文件其实是坏的，已经被丢掉，不带 Range 重新下载
+                    return self.download(arxiv_id)
+            # 包括读完正文和写入仓库的时间
+            METRICS.observe("http_request_seconds", time.perf_counter() - start, endpoint="pdf")
+            METRICS.inc("pdf_downloads_total", outcome="downloaded")
+            return True, False  # 下载成功，但不是使用缓存
+        except (requests.RequestException, InvalidPdfError) as e:
+            print(f"Error downloading {arxiv_id}: {e}")
+            METRICS.inc("pdf_downloads_total", outcome=type(e).__name__)
+            return False, False  # 下载失败，不是使用缓存
+
+    def download_all(self, arxiv_ids):
+        # 按完成顺序产出 (arxiv_id, success, used_cache)
+        # 同时在途的任务数有上限，arxiv_ids 可以是惰性生成器
+        arxiv_ids = iter(arxiv_ids)
+        max_pending = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            while True:
+                for arxiv_id in arxiv_ids:
+                    pending[executor.submit(self.download, arxiv_id)] = arxiv_id
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+                METRICS.gauge("queue_depth", len(pending), queue="pdf_downloads")
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    success, used_cache = future.result()
+                    yield pending.pop(future), success, used_cache
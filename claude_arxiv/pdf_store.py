@@ -0,0 +1,229 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+_VERSION_RE = re.compile(r'v(\d+)\.pdf', re.IGNORECASE)
+PDF_MAGIC = b"%PDF-"
+PDF_EOF = b"%%EOF"
+
+
+class InvalidPdfError(ValueError):
+    pass
+
+
+def check_pdf(path):
+    # 只看文件头的魔数和末尾 1KB 内的 %%EOF，能挡住截断的下载和被当成 PDF 存下来的 HTML 错误页
+    with open(path, 'rb') as f:
+        if f.read(len(PDF_MAGIC)) != PDF_MAGIC:
+            raise InvalidPdfError(f"{path} does not start with {PDF_MAGIC!r}")
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 1024))
+        if PDF_EOF not in f.read():
+            raise InvalidPdfError(f"{path} has no {PDF_EOF!r} trailer, probably truncated")
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def parse_version(response):
+    # arXiv 在 Content-Disposition 里给出带版本号的文件名，比如 filename="2408.00273v1.pdf"
+    match = _VERSION_RE.search(response.headers.get("Content-Disposition", ""))
+    return int(match.group(1)) if match else 0
+
+
+def safe_id(arxiv_id):
+    # 旧式编号（如 cs/0101001）带斜杠，不能直接当文件名
+    return arxiv_id.replace("/", "_")
+
+
+def id_from_filename(filename):
+    # safe_id 的逆过程：新式编号里没有下划线，有下划线的一定是换掉了斜杠的旧式编号
+    name = os.path.splitext(os.path.basename(filename))[0]
+    archive, sep, number = name.rpartition("_")
+    return f"{archive}/{number}" if sep else name
+
+
+class PdfStore:
+    # 按 arxiv_id + 版本号存放每篇 PDF 的唯一一份实体，manifest.jsonl 记录 SHA-256、大小、ETag 和 Last-Modified
+    # 下载先写到 tmp/ 下的 .part 文件，校验通过后再原子地 rename 进 objects/
+    # 各种按分类的目录只是指向这里的硬链接（跨设备时退化为符号链接）
+    def __init__(self, root, link_mode="hardlink"):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.manifest_path = os.path.join(root, "manifest.jsonl")
+        self.link_mode = link_mode
+        self._entries = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._remember(json.loads(line))
+
+    def _remember(self, entry):
+        current = self._entries.get(entry["arxiv_id"])
+        if current is None or entry["version"] >= current["version"]:
+            self._entries[entry["arxiv_id"]] = entry
+
+    def object_path(self, arxiv_id, version):
+        name = safe_id(arxiv_id)
+        return os.path.join(self.objects_dir, name.split(".")[0], f"{name}v{version}.pdf")
+
+    def get(self, arxiv_id):
+        # 返回该论文最新版本的 manifest 记录，没有则为 None
+        with self._lock:
+            return self._entries.get(arxiv_id)
+
+    def has(self, arxiv_id):
+        # 只比对 manifest 里的大小和磁盘上的文件，不读内容也不访问网络
+        entry = self.get(arxiv_id)
+        if entry is None:
+            return False
+        try:
+            return os.path.getsize(self.object_path(arxiv_id, entry["version"])) == entry["size"]
+        except OSError:
+            return False
+
+    def verify(self, arxiv_id):
+        # 完整校验：重新计算 SHA-256 并检查 PDF 头尾
+        entry = self.get(arxiv_id)
+        if entry is None or not self.has(arxiv_id):
+            return False
+        path = self.object_path(arxiv_id, entry["version"])
+        try:
+            check_pdf(path)
+        except InvalidPdfError:
+            return False
+        return file_sha256(path) == entry["sha256"]
+
+    def partial_path(self, arxiv_id):
+        return os.path.join(self.tmp_dir, f"{safe_id(arxiv_id)}.part")
+
+    def partial(self, arxiv_id):
+        # 返回上次没下完的 (已有字节数, 当时的 ETag/Last-Modified/版本号)，没有则为 None
+        path = self.partial_path(arxiv_id)
+        try:
+            size = os.path.getsize(path)
+            with open(f"{path}.json", encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return size, info
+
+    def start_partial(self, arxiv_id, version=0, etag=None, last_modified=None):
+        path = self.partial_path(arxiv_id)
+        with open(f"{path}.json", 'w', encoding='utf-8') as f:
+            json.dump({"version": version, "etag": etag, "last_modified": last_modified}, f)
+        open(path, 'wb').close()
+
+    def add(self, arxiv_id, chunks, version=0, etag=None, last_modified=None, resume=False):
+        if not resume:
+            self.start_partial(arxiv_id, version, etag, last_modified)
+        path = self.partial_path(arxiv_id)
+        with open(path, 'ab') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        return self.finish_partial(arxiv_id)
+
+    def finish_partial(self, arxiv_id):
+        # 校验 .part 文件并移进 objects/，写入 manifest；不是完整的 PDF 就丢掉并抛出 InvalidPdfError
+        # 上次写完最后一块、还没来得及 rename 就中断时，续传会被服务器拒绝（416），直接从这里收尾
+        path = self.partial_path(arxiv_id)
+        try:
+            check_pdf(path)
+        except InvalidPdfError:
+            self.discard_partial(arxiv_id)
+            raise
+
+        _, info = self.partial(arxiv_id)
+        entry = {
+            "arxiv_id": arxiv_id,
+            "version": info["version"],
+            "sha256": file_sha256(path),
+            "size": os.path.getsize(path),
+            "etag": info["etag"],
+            "last_modified": info["last_modified"],
+        }
+        object_path = self.object_path(arxiv_id, entry["version"])
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(path, object_path)
+        os.remove(f"{path}.json")
+
+        with self._lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._remember(entry)
+        return entry
+
+    def import_pdf_dir(self, directory):
+        # 把旧版脚本下载的 <目录>/[<分类>/]<arxiv_id>.pdf 导入仓库，升级后第一次运行不用重新下载
+        # 能硬链接就硬链接，不额外占空间；已经在仓库里的和校验不过的文件跳过。版本号未知，记为 0，和没有
+        # Content-Disposition 时一样；没有 ETag，--revalidate 时会完整地重新请求一次
+        imported = 0
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if not filename.lower().endswith(".pdf"):
+                    continue
+                arxiv_id = id_from_filename(filename)
+                if self.has(arxiv_id):
+                    continue
+                source = os.path.join(dirpath, filename)
+                try:
+                    check_pdf(source)
+                except InvalidPdfError:
+                    continue
+                self.start_partial(arxiv_id)
+                path = self.partial_path(arxiv_id)
+                os.remove(path)
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+                self.finish_partial(arxiv_id)
+                imported += 1
+        return imported
+
+    def discard_partial(self, arxiv_id):
+        path = self.partial_path(arxiv_id)
+        for leftover in (path, f"{path}.json"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    def link(self, arxiv_id, dest_path):
+        # 增量地建立视图：目标已指向同一份实体时直接跳过；返回 True 表示新建或更新了链接
+        entry = self.get(arxiv_id)
+        if entry is None:
+            return False
+        source = self.object_path(arxiv_id, entry["version"])
+        if os.path.exists(dest_path) and os.path.samefile(source, dest_path):
+            return False
+
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        tmp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        if self.link_mode == "hardlink":
+            try:
+                os.link(source, tmp_path)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                os.symlink(os.path.relpath(source, os.path.dirname(dest_path) or "."), tmp_path)
+        else:
+            os.symlink(os.path.relpath(source, os.path.dirname(dest_path) or "."), tmp_path)
+        os.replace(tmp_path, dest_path)
+        return True
@@ -0,0 +1,50 @@
+import multiprocessing
+import threading
+import time
+
+
+class TokenBucket:
+    # 线程安全的令牌桶：rate 为每秒补充的令牌数，capacity 为允许的突发量；rate 为 None 表示不限速
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate or 1, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if self.rate is None:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # 大于桶容量的请求（比如一个很大的数据块）在桶满时放行，之后桶会变为负数来补偿
+                if self._tokens >= min(amount, self.capacity):
+                    self._tokens -= amount
+                    return waited
+                wait = (min(amount, self.capacity) - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class SharedIntervalLimiter:
+    # 跨进程共享的限速器：所有进程排队领取请求时刻，相邻两次请求至少间隔 interval 秒
+    # 需要在创建进程池时通过 initializer 参数传给子进程
+    def __init__(self, interval, context=None):
+        context = context or multiprocessing.get_context()
+        self.interval = interval
+        self._next = context.Value('d', 0.0, lock=False)
+        self._lock = context.Lock()
+
+    def acquire(self, amount=1):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next.value)
+            self._next.value = slot + self.interval * amount
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
@@ -0,0 +1,48 @@
+from operator import attrgetter
+
+# 一条 arXiv 元数据记录的字段，顺序就是写出 JSONL 时的键顺序
+PAPER_FIELDS = ("title", "authors", "abstract", "categories", "created", "updated", "doi", "arxiv_id")
+
+_values = attrgetter(*PAPER_FIELDS)
+
+
+class Paper:
+    # harvest 产出的记录类型：用 __slots__ 存字段，没有每条记录一个 dict 的开销，
+    # 同时保留 paper["title"]、paper.get("updated") 这样的读法，下游按 dict 读的代码不用改
+    # 要改字段或加字段时先 to_dict()
+    __slots__ = PAPER_FIELDS
+
+    def __init__(self, title, authors, abstract, categories, created, updated, doi, arxiv_id):
+        self.title = title
+        self.authors = authors
+        self.abstract = abstract
+        self.categories = categories
+        self.created = created
+        self.updated = updated
+        self.doi = doi
+        self.arxiv_id = arxiv_id
+
+    def __getitem__(self, key):
+        if key not in PAPER_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in PAPER_FIELDS else default
+
+    def keys(self):
+        return PAPER_FIELDS
+
+    def to_dict(self):
+        return dict(zip(PAPER_FIELDS, _values(self)))
+
+    def __eq__(self, other):
+        return isinstance(other, Paper) and _values(self) == _values(other)
+
+    def __repr__(self):
+        return f"Paper(arxiv_id={self.arxiv_id!r}, title={self.title!r})"
+
+
+def as_dict(paper):
+    # 输出端统一经过这里：harvest 产出的是 Paper，从 JSONL 读回来的是普通 dict
+    return paper.to_dict() if isinstance(paper, Paper) else paper
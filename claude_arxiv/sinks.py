@@ -0,0 +1,188 @@
+import json
+import os
+import uuid
+
+from metrics import METRICS
+from records import as_dict
+
+# 所有输出后端都实现 write(paper) / close()，并可用作上下文管理器；count 为已写入的记录数
+
+
+class JsonlSink:
+    def __init__(self, filename, checkpoint=None):
+        self.filename = filename
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            self._file = checkpoint.open_output(filename)
+            self.count = checkpoint.records_written
+        else:
+            self._file = open(filename, 'w', encoding='utf-8')
+            self.count = 0
+
+    def write(self, paper):
+        line = json.dumps(as_dict(paper), ensure_ascii=False)
+        self._file.write(line)
+        self._file.write('\n')
+        METRICS.inc("records_total", stage="sink", outcome="written")
+        METRICS.inc("bytes_out_total", len(line.encode("utf-8")) + 1, sink="jsonl")
+        self.count += 1
+        if self.checkpoint is not None:
+            self.checkpoint.records_written += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetSink:
+    # 按 created 月份和 primary_category 分区（hive 风格目录：created_month=2024-08/primary_category=cs.CV/），
+    # 每个分区在内存里攒够 row_group_size 条再作为一个行组写出，全部缓冲超过 max_buffered_rows 时先写出最大的分区
+    # 每次运行在各分区下写自己的 part-<run_id>.parquet，多次运行可以写进同一个数据集目录
+    # run_id 由调用方按抓取范围给定时，重跑同一范围会替换上次的文件（和 JSONL 覆盖写一样）：
+    # 新文件先写成 .part-<run_id>.parquet.tmp（点开头，读数据集时会被忽略），close 时原子地换上，再删掉这次没写到的分区里同名的旧文件；不给则每次随机生成，只追加
+    # 在 with 块里出错时不换上也不删除，只清理 .tmp，数据集保持上次成功运行的样子
+    def __init__(self, root, row_group_size=10000, max_buffered_rows=100000, compression="zstd", run_id=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow, install it with `pip install pyarrow`")
+        self._pa = pa
+        self._pq = pq
+        self.root = root
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.compression = compression
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.schema = pa.schema([
+            ("arxiv_id", pa.string()),
+            ("title", pa.string()),
+            ("authors", pa.list_(pa.string())),
+            ("abstract", pa.string()),
+            ("categories", pa.list_(pa.string())),
+            ("created", pa.string()),
+            ("updated", pa.string()),
+            ("doi", pa.string()),
+        ])
+        self.count = 0
+        self._buffers = {}
+        self._buffered = 0
+        self._writers = {}
+
+    def write(self, paper):
+        categories = paper["categories"]
+        if isinstance(categories, str):
+            categories = categories.split()
+        key = (paper["created"][:7], categories[0] if categories else "unknown")
+        self._buffers.setdefault(key, []).append({
+            "arxiv_id": paper["arxiv_id"],
+            "title": paper["title"],
+            "authors": paper["authors"],
+            "abstract": paper["abstract"],
+            "categories": categories,
+            "created": paper["created"],
+            "updated": paper.get("updated"),
+            "doi": paper["doi"],
+        })
+        self._buffered += 1
+        self.count += 1
+        METRICS.inc("records_total", stage="sink", outcome="written")
+
+        if len(self._buffers[key]) >= self.row_group_size:
+            self._flush(key)
+        elif self._buffered >= self.max_buffered_rows:
+            self._flush(max(self._buffers, key=lambda k: len(self._buffers[k])))
+
+    def _flush(self, key):
+        rows = self._buffers.pop(key, None)
+        if not rows:
+            return
+        self._buffered -= len(rows)
+        writer = self._writers.get(key)
+        if writer is None:
+            month, category = key
+            directory = os.path.join(self.root, f"created_month={month}", f"primary_category={category}")
+            os.makedirs(directory, exist_ok=True)
+            writer = self._pq.ParquetWriter(os.path.join(directory, f".{self.part_name}.tmp"),
+                                            self.schema, compression=self.compression)
+            self._writers[key] = writer
+        with METRICS.timer("parquet_flush_seconds"):
+            writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema))
+
+    @property
+    def part_name(self):
+        return f"part-{self.run_id}.parquet"
+
+    def close(self):
+        for key in list(self._buffers):
+            self._flush(key)
+        written = set()
+        for writer in self._writers.values():
+            writer.close()
+            path = os.path.join(os.path.dirname(writer.where), self.part_name)
+            os.replace(writer.where, path)
+            written.add(path)
+        self._writers = {}
+        for directory, _, filenames in os.walk(self.root):
+            path = os.path.join(directory, self.part_name)
+            if self.part_name in filenames and path not in written:
+                os.remove(path)
+
+    def abort(self):
+        # 中途失败：丢掉这次写了一半的 .tmp 和缓冲，上次运行的 part 文件原样保留
+        for writer in self._writers.values():
+            writer.close()
+            os.remove(writer.where)
+        self._writers = {}
+        self._buffers = {}
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 只有正常退出才换上新文件并删除旧文件；异常照常抛出
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+SINKS = {
+    "jsonl": JsonlSink,
+    "parquet": ParquetSink,
+}
+
+
+def open_sink(kind, path, **kwargs):
+    if kind not in SINKS:
+        raise ValueError(f"Unknown output format '{kind}', expected one of {sorted(SINKS)}")
+    return SINKS[kind](path, **kwargs)
+
+
+def write_papers(papers, sink):
+    with sink:
+        for paper in papers:
+            sink.write(paper)
+    return sink.count
+
+
+def scan_parquet(root, columns=None, categories=None, months=None):
+    # 分区过滤只打开匹配的目录，columns 只读需要的列；返回 pyarrow.Table
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    conditions = []
+    if categories:
+        conditions.append(ds.field("primary_category").isin(list(categories)))
+    if months:
+        conditions.append(ds.field("created_month").isin(list(months)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
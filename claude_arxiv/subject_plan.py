@@ -0,0 +1,73 @@
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+import requests
+from metrics import METRICS
+from oai_harvest import OAI, fetch_page
+
+# arXiv 的 OAI set 是 group[:archive[:category]]，physics 下的各个 archive 需要带 physics: 前缀
+PHYSICS_ARCHIVES = {
+    "astro-ph", "cond-mat", "gr-qc", "hep-ex", "hep-lat", "hep-ph", "hep-th", "math-ph",
+    "nlin", "nucl-ex", "nucl-th", "physics", "quant-ph",
+}
+
+# set_spec: 请求用的 OAI set；subjects: 本阶段要保留的分类；skip: 已在前面阶段产出过的分类
+SetPlan = namedtuple("SetPlan", ["set_spec", "subjects", "skip"])
+
+
+def group_set(subject):
+    archive = subject.split(".")[0]
+    return f"physics:{archive}" if archive in PHYSICS_ARCHIVES else archive
+
+
+def category_set(subject):
+    # cs.CV -> cs:cs:CV，astro-ph.CO -> physics:astro-ph:CO；没有子类的分类（如 hep-th）就是 archive 本身
+    if "." not in subject:
+        return group_set(subject)
+    archive, sub = subject.split(".", 1)
+    return f"{group_set(subject)}:{archive}:{sub}"
+
+
+def list_sets(session=None, limiter=None):
+    # limiter 传入和 harvest 共用的限速器，紧接着的 ListRecords 请求也会和这里隔开
+    session = session or requests.Session()
+    specs = set()
+    params = {"verb": "ListSets"}
+    while True:
+        if limiter is not None:
+            METRICS.inc("rate_limited_seconds_total", limiter.acquire(), endpoint="oai")
+        with fetch_page(session, params) as response:
+            root = ET.fromstring(response.content)
+        specs.update(elem.text.strip() for elem in root.iter(f"{OAI}setSpec") if elem.text)
+        token = root.find(f".//{OAI}resumptionToken")
+        if token is None or not (token.text or "").strip():
+            return specs
+        params = {"verb": "ListSets", "resumptionToken": token.text.strip()}
+
+
+def plan_subjects(subjects, available_sets=None, scope="cs", limiter=None):
+    # 为每个细分类选服务器支持的最窄的 set；同一个 group 下只要有分类没有细分 set，就合并成一次 group 请求
+    # 多个细分 set 依次抓取，后面的阶段跳过带有前面阶段分类的论文，这样交叉列出的论文只产出一次，
+    # 结果与原来“请求整个 scope（cs）再检查 any(subj in categories)”完全一致：
+    # scope 以外的分类（如 stat.ML）只要求 scope 里交叉列出的论文，所以仍然请求整个 scope 再过滤
+    if available_sets is None:
+        available_sets = list_sets(limiter=limiter)
+
+    by_group = {}
+    for subject in subjects:
+        group = group_set(subject)
+        by_group.setdefault(group if group == scope else scope, []).append(subject)
+
+    plans = []
+    for set_spec, group in by_group.items():
+        if all(group_set(subject) == scope and category_set(subject) in available_sets for subject in group):
+            plans.extend((category_set(subject), frozenset([subject])) for subject in group)
+        else:
+            # 只要有一个分类没有细分 set，就得请求整个 group，其他分类顺带过滤即可
+            plans.append((set_spec, frozenset(group)))
+
+    result = []
+    emitted = frozenset()
+    for set_spec, wanted in plans:
+        result.append(SetPlan(set_spec, wanted, emitted))
+        emitted = emitted | wanted
+    return result
@@ -0,0 +1,249 @@
+import argparse
+import os
+import sys
+
+# 统一入口：python cli.py <command> [options]，python cli.py <command> --help 查看各命令的参数
+#   harvest      按 OAI-PMH 抓取元数据，写成 JSONL 或 Parquet            （claude_arxiv）
+#   download     下载 JSONL 里各篇论文的 PDF 到共享仓库                    （claude_arxiv）
+#   index        把 JSONL 批次增量加入本地检索索引                          （claude_arxiv）
+#   search       按词、分类、作者和日期查询索引                            （claude_arxiv）
+#   enrich       抓取 arXiv 列表页并从 Semantic Scholar 补全引用关系        （tape_arxiv_2023_scraper）
+#   build-graph  构建引用图和节点特征                                      （tape_arxiv_2023_scraper）
+#   load         加载处理好的图并打印概况                                  （tape_arxiv_2023_scraper）
+# 只导入所选命令用到的模块：harvest / download 不会加载 pandas、torch 这些重依赖，适合频繁的定时任务。
+# tape 的命令沿用原脚本的相对路径（dataset/...），在 tape_arxiv_2023_scraper 目录下运行
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = {
+    'claude_arxiv': os.path.join(ROOT, 'claude_arxiv'),
+    'tape': os.path.join(ROOT, 'tape_arxiv_2023_scraper', 'src'),
+}
+
+
+def harvest_command(parser):
+    from metrics import add_metrics_arguments
+
+    parser.add_argument('--start-date', type=str, required=True, help='first created date, YYYY-MM-DD')
+    parser.add_argument('--end-date', type=str, required=True, help='last created date, YYYY-MM-DD')
+    parser.add_argument('--subject', type=str, default='cs', help='OAI set to harvest')
+    parser.add_argument('--output', type=str, default=None,
+                        help='JSONL file or Parquet directory (default: arxiv_<subject>_<start>_to_<end>)')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl',
+                        help='output format; --resume is only supported for jsonl')
+    parser.add_argument('--until-padding', type=int, default=2,
+                        help='extra days of datestamps to request after --end-date')
+    parser.add_argument('--delay', type=float, default=2,
+                        help='minimum seconds between two OAI requests')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted harvest from its checkpoint file')
+    parser.add_argument('--shard-days', type=int, default=0,
+                        help='split the range into windows of this many days and harvest them in parallel')
+    parser.add_argument('--processes', type=int, default=4,
+                        help='number of worker processes for --shard-days')
+    add_metrics_arguments(parser)
+    return run_harvest
+
+
+def run_harvest(args):
+    from checkpoint import HarvestCheckpoint
+    from metrics import METRICS, configure_metrics, write_metrics
+    from oai_harvest import harvest, save_to_jsonl
+    from oai_shards import harvest_sharded
+    from sinks import ParquetSink, write_papers
+
+    configure_metrics(args)
+    output = args.output or f'arxiv_{args.subject}_{args.start_date}_to_{args.end_date}'
+    if args.format == 'jsonl' and not output.endswith('.jsonl'):
+        output += '.jsonl'
+    sink = None
+    if args.format == 'parquet':
+        # 同一范围重跑时替换上次写的分区文件，不会重复
+        sink = ParquetSink(output, run_id=f'{args.subject}_{args.start_date}_to_{args.end_date}'.replace(':', '_'))
+
+    with METRICS.stage('harvest'):
+        if args.shard_days:
+            harvest_sharded(args.start_date, args.end_date, args.subject, output, shard_days=args.shard_days,
+                            processes=args.processes, delay=args.delay, until_padding=args.until_padding, sink=sink)
+        else:
+            checkpoint = None
+            if sink is None:
+                checkpoint = HarvestCheckpoint(f'{output}.checkpoint', {
+                    'start_date': args.start_date, 'end_date': args.end_date, 'subject': args.subject})
+                if args.resume:
+                    checkpoint.load()
+            papers = harvest(args.start_date, args.end_date, args.subject, until_padding=args.until_padding,
+                             delay=args.delay, pipelined=True, checkpoint=checkpoint)
+            if sink is None:
+                save_to_jsonl(papers, output, checkpoint)
+            else:
+                write_papers(papers, sink)
+    write_metrics(args)
+
+
+def download_command(parser):
+    from metrics import add_metrics_arguments
+
+    parser.add_argument('input', type=str, help='JSONL file written by the harvest command')
+    parser.add_argument('--store', type=str, default=os.environ.get('ARXIV_PDF_STORE', 'arxiv_pdf_store'),
+                        help='content-addressed PDF store shared by all runs')
+    parser.add_argument('--link-dir', type=str, default=None,
+                        help='also link every PDF into <link-dir>/<category>/ for each of its categories')
+    parser.add_argument('--import-dir', type=str, default=None,
+                        help='first add the <id>.pdf files an older script downloaded under this folder to the store')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests-per-second', type=float, default=1.0)
+    parser.add_argument('--bytes-per-second', type=float, default=None)
+    parser.add_argument('--revalidate', action='store_true',
+                        help='ask the server whether stored PDFs changed instead of trusting the store')
+    add_metrics_arguments(parser)
+    return run_download
+
+
+def run_download(args):
+    from metrics import METRICS, configure_metrics, write_metrics
+    from oai_harvest import read_jsonl
+    from pdf_download import PdfDownloader
+    from pdf_store import PdfStore, safe_id
+
+    configure_metrics(args)
+    store = PdfStore(args.store)
+    if args.import_dir:
+        print(f'{store.import_pdf_dir(args.import_dir)} PDFs imported from {args.import_dir}')
+    downloader = PdfDownloader(store, workers=args.workers, requests_per_second=args.requests_per_second,
+                               bytes_per_second=args.bytes_per_second, revalidate=args.revalidate)
+    downloaded = cached = failed = 0
+    with METRICS.stage('download'):
+        for _, success, used_cache in downloader.download_all(paper['arxiv_id'] for paper in read_jsonl(args.input)):
+            if not success:
+                failed += 1
+            elif used_cache:
+                cached += 1
+            else:
+                downloaded += 1
+    print(f'{downloaded} downloaded, {cached} already stored, {failed} failed')
+
+    if args.link_dir:
+        with METRICS.stage('organize'):
+            linked = 0
+            for paper in read_jsonl(args.input):
+                if not store.has(paper['arxiv_id']):
+                    continue
+                categories = paper['categories']
+                if isinstance(categories, str):
+                    categories = categories.split()
+                filename = f"{safe_id(paper['arxiv_id'])}.pdf"
+                for category in categories:
+                    linked += store.link(paper['arxiv_id'], os.path.join(args.link_dir, category, filename))
+        print(f'{linked} links created or updated under {args.link_dir}')
+    write_metrics(args)
+
+
+def index_command(parser):
+    parser.add_argument('inputs', nargs='+', help='JSONL files; only lines appended since the last run are read')
+    parser.add_argument('--db', type=str, default='arxiv_index.sqlite', help='index file')
+    return run_index
+
+
+def run_index(args):
+    from paper_index import PaperIndex
+
+    index = PaperIndex(args.db)
+    for path in args.inputs:
+        added, replaced = index.add_jsonl(path)
+        print(f'{path}: {added} added, {replaced} replaced')
+    print(f'Papers in {args.db}: {index.count()}')
+    index.close()
+
+
+def search_command(parser):
+    parser.add_argument('query', nargs='?', default='', help='words that must all appear in the title or abstract; stopwords and single letters are ignored, '
+                             'so a query made only of them matches nothing')
+    parser.add_argument('--category', action='append', default=[],
+                        help='keep papers in this category, can be repeated (any of them matches)')
+    parser.add_argument('--author', action='append', default=[],
+                        help='keep papers with an author whose name starts with this, can be repeated')
+    parser.add_argument('--since', type=str, default=None, help='first created date, YYYY-MM-DD')
+    parser.add_argument('--until', type=str, default=None, help='last created date, YYYY-MM-DD')
+    parser.add_argument('--limit', type=int, default=20, help='maximum number of results, 0 for all')
+    parser.add_argument('--jsonl', action='store_true', help='print the full records as JSON lines')
+    parser.add_argument('--db', type=str, default='arxiv_index.sqlite', help='index file')
+    return run_search
+
+
+def run_search(args):
+    import json
+    from paper_index import PaperIndex, paper_categories
+
+    index = PaperIndex(args.db)
+    papers = index.search(args.query, categories=args.category, authors=args.author,
+                          since=args.since, until=args.until, limit=args.limit or None)
+    index.close()
+    for paper in papers:
+        if args.jsonl:
+            print(json.dumps(paper, ensure_ascii=False))
+        else:
+            categories = paper_categories(paper)
+            print(f"{paper['arxiv_id']}  {paper['created']}  {categories[0] if categories else '-':10s}  {paper['title']}")
+
+
+def enrich_command(parser):
+    from collect import add_arguments, main
+
+    add_arguments(parser)
+    return main
+
+
+def build_graph_command(parser):
+    from process import add_arguments, main
+
+    add_arguments(parser)
+    return main
+
+
+def load_command(parser):
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--use-text', action='store_true', help='also load the node texts')
+    return run_load
+
+
+def run_load(args):
+    from load_arxiv_2023 import get_raw_text_arxiv_2023
+
+    data, text = get_raw_text_arxiv_2023(use_text=args.use_text, seed=args.seed)
+    print(f'# nodes: {data.num_nodes}')
+    print(f'# edges: {data.edge_index.shape[1]}')
+    print(f'# features: {data.x.shape[1]}')
+    print(f'train/val/test: {len(data.train_id)}/{len(data.val_id)}/{len(data.test_id)}')
+    if text is not None:
+        print(f'# texts: {len(text)}')
+
+
+# 命令 -> (所属子项目, 帮助, 添加参数并返回执行函数的函数)；参数只为所选命令构建，其余命令的模块不会被导入
+COMMANDS = {
+    'harvest': ('claude_arxiv', 'harvest arXiv metadata over OAI-PMH', harvest_command),
+    'download': ('claude_arxiv', 'download the PDFs of harvested papers', download_command),
+    'index': ('claude_arxiv', 'add harvested JSONL files to the local search index', index_command),
+    'search': ('claude_arxiv', 'query the local index by words, category, author and date', search_command),
+    'enrich': ('tape', 'crawl arXiv listings and fetch citations from Semantic Scholar', enrich_command),
+    'build-graph': ('tape', 'construct the citation graph and node features', build_graph_command),
+    'load': ('tape', 'load the processed graph and print a summary', load_command),
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(prog='cli.py', description='arXiv scraping and graph-building pipeline')
+    subparsers = parser.add_subparsers(dest='command', metavar='command', required=True)
+    # 第一个不以 - 开头的参数就是命令名；只把所选命令的子项目目录放进 sys.path，
+    # tape 的 collect.py / process.py 会自己把 claude_arxiv 加在最后，用的是同一个 metrics.py
+    chosen = next((arg for arg in argv if not arg.startswith('-')), None)
+    for name, (project, help_text, configure) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        if name == chosen:
+            sys.path.insert(0, PROJECTS[project])
+            subparser.set_defaults(run=configure(subparser))
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
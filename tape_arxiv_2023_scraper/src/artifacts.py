@@ -0,0 +1,59 @@
+import json
+import os
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+
+
+def save_artifacts(directory, arrays, **meta):
+    # Each array is saved as its own .npy and the manifest records file name, dtype and shape. The manifest is
+    # written last and atomically, so readers see either the complete old artifacts or the complete new ones
+    os.makedirs(directory, exist_ok=True)
+    entries = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        filename = f'{name}.npy'
+        np.save(os.path.join(directory, f'{filename}.tmp.npy'), array)
+        os.replace(os.path.join(directory, f'{filename}.tmp.npy'), os.path.join(directory, filename))
+        entries[name] = {'file': filename, 'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    tmp_path = os.path.join(directory, f'{MANIFEST}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'arrays': entries, **meta}, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+
+class GraphArtifacts:
+    # Opens arrays on demand: each is mmapped on first access and the returned tensor shares the mapping, no
+    # copy. Training processes on one machine share the page cache. mmap_mode='c' is copy-on-write, so writes
+    # never reach the file
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self._tensors = {}
+
+    def __contains__(self, name):
+        return name in self.manifest['arrays']
+
+    def array(self, name):
+        entry = self.manifest['arrays'][name]
+        return np.load(os.path.join(self.directory, entry['file']), mmap_mode='c')
+
+    def tensor(self, name):
+        import torch  # Not loaded when only numpy arrays are read
+
+        if name not in self._tensors:
+            self._tensors[name] = torch.from_numpy(self.array(name))
+        return self._tensors[name]
+
+    def __getattr__(self, name):
+        manifest = self.__dict__.get('manifest')
+        if name.startswith('_') or manifest is None or name not in manifest['arrays']:
+            raise AttributeError(name)
+        return self.tensor(name)
+
+
+def load_artifacts(directory):
+    return GraphArtifacts(directory)
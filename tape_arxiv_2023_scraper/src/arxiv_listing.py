@@ -0,0 +1,186 @@
+import asyncio
+import html
+import json
+import os
+import re
+import sys
+import time
+
+import aiohttp
+import pandas as pd
+
+# metrics.py is shared with claude_arxiv
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'claude_arxiv'))
+
+from metrics import METRICS
+from s2_client import AdaptiveRateLimiter
+
+LISTING_URL = os.environ.get('ARXIV_LISTING_URL', 'https://arxiv.org/list/{archive}/{month}')
+ITEMS_PER_PAGE = 2000  # A listing page shows at most 2000 entries
+
+# Listing pages have a fixed structure, so targeted regexes extract them about 100x faster than a
+# BeautifulSoup tree. They match both the old and the new page markup
+_DT = re.compile(r'<dt\b[^>]*>')
+_ARXIV_ID = re.compile(r'arXiv:\s*([^\s<]+)')
+_TITLE = re.compile(r'''<div class=['"]list-title mathjax['"]>(.*?)</div>''', re.S)
+_PRIMARY_SUBJECT = re.compile(r'''<span class=['"]primary-subject['"]>(.*?)</span>''', re.S)
+_TOTAL = re.compile(r'[Tt]otal of\s+([\d,]+)\s+entries')
+_TAG = re.compile(r'<[^>]+>')
+
+
+def _text(fragment):
+    return ' '.join(html.unescape(_TAG.sub('', fragment)).split())
+
+
+def parse_listing(page):
+    # Returns (total entries in the month, [(arxiv_id, title, subject), ...]); each <dt> up to the next one is
+    # an entry
+    total = _TOTAL.search(page)
+    if total is None:
+        raise ValueError('listing page has no "total of N entries" marker')
+    entries = []
+    for chunk in _DT.split(page)[1:]:
+        arxiv_id = _ARXIV_ID.search(chunk)
+        if arxiv_id is None:
+            continue
+        title = _TITLE.search(chunk)
+        subject = _PRIMARY_SUBJECT.search(chunk)
+        entries.append((
+            arxiv_id.group(1),
+            _text(title.group(1)).replace('Title:', '', 1).strip() if title else '',
+            _text(subject.group(1)) if subject else '',
+        ))
+    return int(total.group(1).replace(',', '')), entries
+
+
+def month_range(start, end):
+    # 2311 -> 2312 -> 2401, never 2313
+    months = []
+    year, month = divmod(start, 100)
+    while year * 100 + month <= end:
+        months.append(f'{year:02d}{month:02d}')
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class ListingManifest:
+    # Records each month's total and the skips already on disk. Rewritten atomically after every page; re-runs
+    # skip those pages
+    def __init__(self, path):
+        self.path = path
+        self.totals = {}
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.totals = state['totals']
+            self.pages = {month: set(skips) for month, skips in state['pages'].items()}
+
+    def done(self, month, skip):
+        return skip in self.pages.get(month, ())
+
+    def mark(self, month, skip, total):
+        self.totals[month] = total
+        self.pages.setdefault(month, set()).add(skip)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'totals': self.totals,
+                       'pages': {month: sorted(skips) for month, skips in self.pages.items()}}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ListingCrawler:
+    # Months and pages are fetched concurrently behind one rate limiter (arXiv asks for about one request
+    # every 3 seconds). The first page of a month also gives its total, so there is no separate count request
+    # before the remaining pages
+    def __init__(self, out_dir, archive='cs', limiter=None, concurrency=4, max_retries=5,
+                 items_per_page=ITEMS_PER_PAGE):
+        self.out_dir = out_dir
+        self.archive = archive
+        self.limiter = limiter or AdaptiveRateLimiter(rate=1 / 3, max_rate=1 / 3)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.items_per_page = items_per_page
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest = ListingManifest(os.path.join(out_dir, 'manifest.json'))
+
+    def page_path(self, month, skip):
+        return os.path.join(self.out_dir, f'arxiv{month}_skip{skip}.csv')
+
+    async def _fetch(self, session, semaphore, month, skip):
+        url = LISTING_URL.format(archive=self.archive, month=month)
+        params = {'skip': skip, 'show': self.items_per_page}
+        for attempt in range(self.max_retries):
+            METRICS.inc('rate_limited_seconds_total', await self.limiter.acquire(), endpoint='listing')
+            if attempt:
+                METRICS.inc('http_retries_total', endpoint='listing')
+            try:
+                async with semaphore:
+                    start = time.perf_counter()
+                    async with session.get(url, params=params) as response:
+                        METRICS.inc('http_responses_total', endpoint='listing', status=response.status)
+                        if response.status in (429, 500, 502, 503, 504):
+                            retry_after = response.headers.get('Retry-After')
+                            self.limiter.on_throttle(float(retry_after) if retry_after and retry_after.isdigit() else None)
+                            continue
+                        response.raise_for_status()
+                        data = await response.read()
+                        encoding = response.get_encoding()
+                    METRICS.observe('http_request_seconds', time.perf_counter() - start, endpoint='listing')
+                METRICS.inc('bytes_in_total', len(data), endpoint='listing')
+                page = data.decode(encoding, errors='replace')
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                METRICS.inc('http_errors_total', endpoint='listing')
+                self.limiter.on_throttle()
+                if attempt == self.max_retries - 1:
+                    raise
+                continue
+            return page
+        raise RuntimeError(f'gave up on {url}?skip={skip} after {self.max_retries} attempts')
+
+    async def _crawl_page(self, session, semaphore, month, skip):
+        page = await self._fetch(session, semaphore, month, skip)
+        with METRICS.timer('parse_seconds', stage='listing'):
+            total, entries = parse_listing(page)
+        METRICS.inc('records_total', len(entries), stage='listing')
+        METRICS.inc('pages_total', stage='listing')
+        # Write to a temporary file and rename, so an interruption never leaves half a page; a refetched page
+        # replaces the old one
+        path = self.page_path(month, skip)
+        pd.DataFrame(entries, columns=['arxiv_id', 'title', 'subject']).to_csv(f'{path}.tmp', index=False)
+        os.replace(f'{path}.tmp', path)
+        self.manifest.mark(month, skip, total)
+        print(f'Crawled {month} skip={skip}: {len(entries)} entries')
+        return total
+
+    async def _crawl_month(self, session, semaphore, month):
+        total = self.manifest.totals.get(month)
+        if total is None or not self.manifest.done(month, 0):
+            total = await self._crawl_page(session, semaphore, month, 0)
+        todo = [skip for skip in range(self.items_per_page, total, self.items_per_page)
+                if not self.manifest.done(month, skip)]
+        await asyncio.gather(*(self._crawl_page(session, semaphore, month, skip) for skip in todo))
+        return [self.page_path(month, skip) for skip in range(0, total, self.items_per_page)]
+
+    async def crawl(self, months):
+        # Paths of every page CSV, sorted by month and skip
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+            paths = await asyncio.gather(*(self._crawl_month(session, semaphore, month) for month in months))
+        return [path for month_paths in paths for path in month_paths]
+
+
+def merge_pages(paths, path, subject_filter='(cs.'):
+    # Merge the pages in-process, keeping papers whose primary subject matches. Deduplicate by arxiv_id, since
+    # entries added while paging make neighbouring pages overlap
+    df = pd.concat([pd.read_csv(page_path, dtype=str, keep_default_na=False) for page_path in paths],
+                   ignore_index=True)
+    duplicates = int(df['arxiv_id'].duplicated().sum())
+    df = df.drop_duplicates('arxiv_id')
+    if subject_filter:
+        df = df[df['subject'].str.contains(subject_filter, regex=False)]
+    df.to_csv(path, index=False)
+    print(f'Merged {len(paths)} pages, dropped {duplicates} duplicate entries')
+    return df
@@ -1,155 +1,150 @@
-import json
 import os
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import concurrent.futures
+import sys
+import asyncio
 import time
-from random import randint
 import argparse
 
+# metrics.py is shared with claude_arxiv
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'claude_arxiv'))
 
-def craw_single_page(base_url, skip=0, show=25):
-    # Define the URL of the webpage you want to scrape
-    url = f"{base_url}?skip={skip}&show={show}"
-
-    # Send an HTTP GET request to the URL
-    response = requests.get(url)
-
-    arxiv_ids = []
-    titles = []
-    subjects = []
-
-    # Check if the request was successful (status code 200)
-    if response.status_code == 200:
-        print("Successfully retrieved the webpage: ", url)
-        # Parse the HTML content of the page
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find all items in the source code
-        items_dd = soup.find_all('dd')
-        items_dt = soup.find_all('dt')
-        assert len(items_dd) == len(items_dt)
-
-        # Loop through the items and extract information
-        for dd, dt in zip(items_dd, items_dt):
-            # Extract the title
-            title_element = dd.find('div', class_='list-title mathjax')
-            title = title_element.text.strip().replace("Title:", "").strip()
-            titles.append(title)
-
-            # Find the primary subject element and extract the primary subject text
-            primary_subject_element = dd.find('span', class_='primary-subject')
-            primary_subject = primary_subject_element.text.strip()
-            subjects.append(primary_subject)
-
-            arxiv_id_element = dt.find('span', class_='list-identifier')
-            arxiv_id = arxiv_id_element.a.text.split(':')[-1].strip()
-            arxiv_ids.append(arxiv_id)
-        df = pd.DataFrame(
-            {'arxiv_id': arxiv_ids, 'title': titles, 'subject': subjects})
-        date = base_url.split('/')[-1]
-
-        outdir = 'dataset/arxiv_2023_orig/temp'
-        if not os.path.exists(outdir):
-            os.makedirs(outdir)
-
-        df.to_csv(f'{outdir}/arxiv{date}_skip{skip}.csv',
-                  mode='a', index=False, header=False)
-
-    else:
-        print("Failed to retrieve the webpage. Status code:", response.status_code)
-
-
-def find_total_entries(base_url):
-    # Send an HTTP GET request to the URL
-    response = requests.get(base_url)
-
-    # Parse the HTML content of the page
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    # Find the total number of entries
-    total_entries = int(soup.find('small').text.split('of')
-                        [-1].split('entries')[0].strip())
-    return total_entries
+from arxiv_listing import ListingCrawler, merge_pages, month_range
+from metrics import METRICS, add_metrics_arguments, configure_metrics, write_metrics
+from paper_info_store import PaperInfoStore
+from s2_client import ResponseCache, S2Client, find_truncated
 
 
 def get_paper_list_from_arxiv_daily(start=2301, end=2310):
     print(f"Start crawling cs arxiv papers from {start} to {end}...")
     start_time = time.time()
 
-    # Define the base URL
-    for i in range(start, end+1):
-        base_url = f'https://arxiv.org/list/cs/{i}'
-
-        # Define the base URL and starting skip value
-        skip = 0
-        items_per_page = 2000  # Number of items per page
-        total_entries = find_total_entries(base_url)
-
-        # Loop through the pages and collect paper information
-        for _ in range(0, total_entries, items_per_page):
-            craw_single_page(base_url=base_url, skip=skip, show=items_per_page)
-            skip += items_per_page
-
-    # Merge all csv files
+    # Page CSVs and the manifest stay in the temp directory, so a re-run only fetches unfinished pages
     out_dir = 'dataset/arxiv_2023_orig'
-    path = f'{out_dir}/arxiv_2023_{start}_{end}.csv'
-    os.system(f'cat {out_dir}/temp/*.csv > {path}')
-    os.system(f'rm -rf {out_dir}/temp')
-
-    # Post processing: remove non-cs arxiv papers
-    df = pd.read_csv(path, dtype=str)
-    df.columns = ['arxiv_id', 'title', 'subject']
-    df = df[df['subject'].apply(lambda x: '(cs.' in x)]
-    df.to_csv(path, index=False)
+    crawler = ListingCrawler(f'{out_dir}/temp')
+    paths = asyncio.run(crawler.crawl(month_range(start, end)))
+
+    # Merge all pages and remove non-cs arxiv papers
+    df = merge_pages(paths, f'{out_dir}/arxiv_2023_{start}_{end}.csv')
     print(
         f"Finished crawling cs arxiv papers in {(time.time() - start_time)/60:.2f} minutes")
     print('Total number of papers: ', len(df))
     return df
 
 
-def get_paper_info_from_semantic_scholar(arxiv_id, subject, retry=3):
-
-    out_dir = 'dataset/arxiv_2023_orig/paper_info'
+def get_paper_info_from_semantic_scholar(arxiv_ids, subjects,
+                                         fields='title,abstract,citations,references,citationCount,referenceCount'):
+    out_dir = 'dataset/arxiv_2023_orig'
     if not os.path.exists(out_dir):
-        os.mkdir(out_dir)
-
-    path = f'{out_dir}/{arxiv_id}.json'
-    if os.path.exists(path):
-        return
-
-    url = f'https://api.semanticscholar.org/graph/v1/paper/arXiv:{arxiv_id}?fields=title,abstract,citations,references'
-    # S2_API_KEY = "TYZHUNFiQj7TGXBSdJerG1PHejGg3ffC6fZ2jRY6"
-    while retry > 0:
-        # response = requests.get(url, headers={'X-API-KEY': S2_API_KEY})
-        response = requests.get(url)
-        if response.status_code == 200:
-            response = response.json()
-            response['arxiv_id'] = arxiv_id
-            response['subject'] = subject
-            json.dump(response, open(path, 'w'), indent=4)
-            return
-        else:
-            time.sleep(randint(1, 5))
-            retry -= 1
-    # print('Fail to get paper info:', url)
-
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
+        os.makedirs(out_dir)
+
+    subject_of = dict(zip(arxiv_ids, subjects))
+    # All enrichment results live in one SQLite file keyed by arxiv_id; the set of stored ids
+    # is read with a single scan instead of checking one json file per paper
+    store = PaperInfoStore(f'{out_dir}/paper_info.sqlite')
+    stored = store.ids()
+
+    def write_paper_info(arxiv_id, response, overwrite=False):
+        # Returns True if the record was written; an overwrite with an identical record is skipped
+        if arxiv_id in stored and not overwrite:
+            return False
+        response['arxiv_id'] = arxiv_id
+        response['subject'] = subject_of[arxiv_id]
+        if arxiv_id in stored and store.get(arxiv_id) == response:
+            return False
+        store.put(arxiv_id, response)
+        stored.add(arxiv_id)
+        return True
+
+    # Responses are cached by (arxiv_id, fields); ids S2 does not know and batches that kept failing
+    # go to a failure ledger in the same file, the latter are retried on the next run
+    cache = ResponseCache(f'{out_dir}/s2_cache.sqlite')
+    client = S2Client(cache)
+    stats = asyncio.run(client.enrich(arxiv_ids, fields, on_result=write_paper_info))
+
+    # Papers answered from the cache on an earlier run may still be missing from the store
+    for arxiv_id in set(arxiv_ids) - stored:
+        response = cache.get(arxiv_id, fields)
+        if response is not None:
+            write_paper_info(arxiv_id, response)
+
+    rewritten = complete_truncated_neighbors(client, arxiv_ids, fields, write_paper_info)
+    cache.close()
+    # Rewriting papers with completed neighbor lists leaves free pages behind; compact() only
+    # rewrites the file once enough of it is free
+    if rewritten:
+        store.compact()
+    store.close()
+
+    print(f"Semantic Scholar: {stats['fetched']} fetched, {stats['cached']} cached, {stats['failed']} failed")
+    return stats
+
+
+def complete_truncated_neighbors(client, arxiv_ids, fields, write_paper_info):
+    # The batch endpoint truncates inline citations/references of highly cited papers;
+    # page through the dedicated endpoints for those and rewrite their paper_info with the full lists.
+    # Returns the number of papers rewritten
+    cache = client.cache
+    jobs = []
+    for arxiv_id in arxiv_ids:
+        response = cache.get(arxiv_id, fields)
+        if response is not None:
+            jobs.extend((arxiv_id, kind, expected) for kind, expected in find_truncated(response))
+    if not jobs:
+        return 0
+
+    print(f"Paging citations/references for {len(set(job[0] for job in jobs))} papers with truncated lists...")
+    failed = asyncio.run(client.fetch_neighbors(jobs))
+
+    rewritten = 0
+    for arxiv_id in set(job[0] for job in jobs):
+        response = cache.get(arxiv_id, fields)
+        changed = False
+        for kind, _ in find_truncated(response):
+            inline = response[kind] or []
+            paged = cache.neighbors(arxiv_id, kind)
+            if cache.neighbor_offset(arxiv_id, kind) is None and len(paged) > len(inline):
+                # Paging finished: the paged list is the full one
+                response[kind] = [{'paperId': paper_id} for paper_id in paged]
+                changed = True
+            else:
+                # Failed or partial crawl: never drop edges already known, only add the pages fetched so far
+                known = {neighbor.get('paperId') for neighbor in inline}
+                extra = [{'paperId': paper_id} for paper_id in paged if paper_id not in known]
+                if extra:
+                    response[kind] = inline + extra
+                    changed = True
+        if changed and write_paper_info(arxiv_id, response, overwrite=True):
+            rewritten += 1
+
+    stats = cache.completeness()
+    complete = sum(1 for _, _, expected, fetched, finished in stats if finished and fetched >= expected)
+    print(f"Neighbor lists: {complete}/{len(stats)} complete, {len(failed)} failed to page, {rewritten} papers updated")
+    return rewritten
+
+
+def add_arguments(parser):
     parser.add_argument('--START', type=int, default=2301)
     parser.add_argument('--END', type=int, default=2309)
-    args = parser.parse_args()
+    add_metrics_arguments(parser, upper=True)
+
 
-    df = get_paper_list_from_arxiv_daily(args.START, args.END)
+def main(args):
+    configure_metrics(args)
+
+    with METRICS.stage('listing'):
+        df = get_paper_list_from_arxiv_daily(args.START, args.END)
     arxiv_ids = df['arxiv_id'].tolist()
     categories = df['subject'].tolist()
 
     start = time.time()
     print("Start getting paper info from Semantic Scholar...")
-    with concurrent.futures.ProcessPoolExecutor(max_workers=16) as executor:
-        res = executor.map(
-            get_paper_info_from_semantic_scholar, arxiv_ids, categories)
+    with METRICS.stage('enrichment'):
+        get_paper_info_from_semantic_scholar(arxiv_ids, categories)
     print(
         f"Finish getting paper info from Semantic Scholar in {(time.time() - start)/60:.2f} mins")
+    write_metrics(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    main(parser.parse_args())
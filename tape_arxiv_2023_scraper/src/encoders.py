@@ -0,0 +1,297 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+# Every text encoder implements load() / encode(texts) -> float32 matrix and has a key (name + version).
+# Configuration is passed to the constructor and the model is only loaded in load(), so encoders can be sent
+# to pool workers
+
+
+def load_word2vec_model(MODEL_PATH, cache_path=None):
+    # The first run converts the GoogleNews binary to gensim's native format with the vectors in a separate
+    # .npy. Later runs memory-map it instead of parsing the 3.6 GB model file on every start
+    try:
+        import gensim
+    except ImportError:
+        raise ImportError("The word2vec encoder requires gensim, install it with `pip install gensim`")
+    MODEL_PATH = os.path.expanduser(MODEL_PATH)
+    if cache_path is None:
+        cache_path = MODEL_PATH.split('.bin')[0] + '.kv'
+    if not os.path.exists(cache_path):
+        print(f"Converting {MODEL_PATH} to {cache_path} (only on the first run)...")
+        model = gensim.models.KeyedVectors.load_word2vec_format(
+            MODEL_PATH, binary=True)
+        model.save(cache_path)
+    return gensim.models.KeyedVectors.load(cache_path, mmap='r')
+
+
+def word2vec_features(model, texts, chunk_tokens=1 << 18):
+    # A text is the mean of the vectors of its in-vocabulary words, or a zero vector if none are in the
+    # vocabulary. All texts are tokenized up front and mapped to vocabulary indices, looking up each distinct
+    # word once. Word vectors are then gathered in chunks and segment-summed per document into a preallocated
+    # float32 matrix
+    lengths = np.empty(len(texts), dtype=np.int64)
+    tokens = []
+    for i, text in enumerate(texts):
+        words = text.split()
+        lengths[i] = len(words)
+        tokens.extend(words)
+
+    codes, uniques = pd.factorize(np.array(tokens, dtype=object))
+    key_to_index = model.key_to_index
+    vocab_index = np.fromiter((key_to_index.get(word, -1) for word in uniques),
+                              dtype=np.int64, count=len(uniques))
+    token_index = vocab_index[codes]
+    doc_index = np.repeat(np.arange(len(texts)), lengths)
+    hits = token_index >= 0
+    token_index, doc_index = token_index[hits], doc_index[hits]
+
+    vectors = model.vectors
+    x = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+    for begin in range(0, len(token_index), chunk_tokens):
+        docs = doc_index[begin:begin + chunk_tokens]
+        gathered = vectors[token_index[begin:begin + chunk_tokens]]
+        # doc_index is sorted, so each run of one document is summed once; a document spanning two chunks is
+        # added to twice
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        x[docs[starts]] += np.add.reduceat(gathered, starts, axis=0, dtype=np.float32)
+
+    counts = np.bincount(doc_index, minlength=len(texts))
+    found = counts > 0
+    x[found] /= counts[found][:, None]
+    return x
+
+
+class Word2VecEncoder:
+    version = 'mean-1'
+
+    def __init__(self, model_path, model_cache=None):
+        self.model_path = model_path
+        self.model_cache = model_cache
+        self.key = f"word2vec:{os.path.basename(model_path).split('.bin')[0]}:{self.version}"
+        self._model = None
+
+    def load(self):
+        if self._model is None:
+            self._model = load_word2vec_model(self.model_path, self.model_cache)
+
+    def encode(self, texts):
+        self.load()
+        return word2vec_features(self._model, texts)
+
+    def __getstate__(self):
+        # The mapped model is not pickled to workers; each worker maps it again and shares the page cache
+        return {**self.__dict__, '_model': None}
+
+
+class TfidfSvdEncoder:
+    # TF-IDF + truncated SVD. Fitted once and saved to model_path, so incremental runs reuse the same
+    # projection. The key includes a fingerprint of the fit, so refitting invalidates the cached vectors
+    version = 'tfidf-svd-1'
+
+    def __init__(self, model_path, dim=300, max_features=200000):
+        self.model_path = model_path
+        self.dim = dim
+        self.max_features = max_features
+        self.key = None
+        self._pipeline = None
+
+    def fit(self, texts):
+        try:
+            from sklearn.decomposition import TruncatedSVD
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.pipeline import make_pipeline
+        except ImportError:
+            raise ImportError("The tfidf-svd encoder requires scikit-learn, install it with `pip install scikit-learn`")
+        if not os.path.exists(self.model_path):
+            print(f"Fitting TF-IDF + SVD ({self.dim} dims) on {len(texts)} texts...")
+            pipeline = make_pipeline(TfidfVectorizer(max_features=self.max_features, sublinear_tf=True),
+                                     TruncatedSVD(n_components=self.dim))
+            pipeline.fit(texts)
+            with open(f'{self.model_path}.tmp', 'wb') as f:
+                pickle.dump(pipeline, f)
+            os.replace(f'{self.model_path}.tmp', self.model_path)
+        self.load()
+
+    def load(self):
+        if self._pipeline is None:
+            with open(self.model_path, 'rb') as f:
+                blob = f.read()
+            self._pipeline = pickle.loads(blob)
+            self.key = f"{self.version}:{self.dim}:{hashlib.sha1(blob).hexdigest()[:12]}"
+
+    def encode(self, texts):
+        self.load()
+        return self._pipeline.transform(texts).astype(np.float32)
+
+
+class SentenceTransformerEncoder:
+    version = 'st-1'
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', batch_size=64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.key = f"{self.version}:{model_name}"
+        self._model = None
+
+    def load(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise ImportError("The sentence-transformer encoder requires sentence-transformers, "
+                                  "install it with `pip install sentence-transformers`")
+            self._model = SentenceTransformer(self.model_name, device='cpu')
+
+    def encode(self, texts):
+        self.load()
+        return self._model.encode(list(texts), batch_size=self.batch_size,
+                                  convert_to_numpy=True).astype(np.float32)
+
+    def __getstate__(self):
+        return {**self.__dict__, '_model': None}
+
+
+ENCODERS = {
+    "word2vec": Word2VecEncoder,
+    "tfidf-svd": TfidfSvdEncoder,
+    "sentence-transformer": SentenceTransformerEncoder,
+}
+
+
+def make_encoder(kind, **kwargs):
+    if kind not in ENCODERS:
+        raise ValueError(f"Unknown encoder '{kind}', expected one of {sorted(ENCODERS)}")
+    return ENCODERS[kind](**kwargs)
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    # Stores vectors and the hash of their text by (encoder key, arxiv_id); a changed text or encoder version
+    # is a miss
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                arxiv_id TEXT NOT NULL,
+                encoder TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (encoder, arxiv_id)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def hashes(self, encoder):
+        rows = self.conn.execute('SELECT arxiv_id, text_hash FROM embeddings WHERE encoder = ?', (encoder,))
+        return dict(rows.fetchall())
+
+    def put_many(self, encoder, arxiv_ids, hashes, vectors):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (arxiv_id, encoder, text_hash, vector) VALUES (?, ?, ?, ?)',
+                [(arxiv_id, encoder, h, np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+                 for arxiv_id, h, vector in zip(arxiv_ids, hashes, vectors)])
+
+    def vectors(self, encoder):
+        rows = self.conn.execute('SELECT arxiv_id, vector FROM embeddings WHERE encoder = ?', (encoder,))
+        for arxiv_id, vector in rows:
+            yield arxiv_id, np.frombuffer(vector, dtype=np.float32)
+
+    def close(self):
+        self.conn.close()
+
+
+_worker_encoder = None
+
+
+def _init_worker(encoder):
+    global _worker_encoder
+    _worker_encoder = encoder
+    _worker_encoder.load()
+
+
+def _encode_batch(texts):
+    return _worker_encoder.encode(texts)
+
+
+def encode_corpus(encoder, corpus, cache, batch_size=2048, processes=None):
+    # corpus is an iterable of (arxiv_id, text), streamed in batches. Only papers missing from the cache or
+    # whose text hash changed are encoded again. Missed batches are encoded on a process pool and written to
+    # the cache as they arrive. Returns a float32 matrix in corpus order
+    if encoder.key is None:
+        # The key of a fitted encoder is only known once the model is loaded
+        encoder.load()
+    cached = cache.hashes(encoder.key)
+    arxiv_ids = []
+    stats = {'cached': 0, 'encoded': 0}
+
+    def missing_batches():
+        batch = ([], [], [])
+        for arxiv_id, text in corpus:
+            arxiv_ids.append(arxiv_id)
+            h = text_hash(text)
+            if cached.get(arxiv_id) == h:
+                stats['cached'] += 1
+                continue
+            for column, value in zip(batch, (arxiv_id, h, text)):
+                column.append(value)
+            if len(batch[0]) >= batch_size:
+                yield batch
+                batch = ([], [], [])
+        if batch[0]:
+            yield batch
+
+    def store(ids, hashes, vectors):
+        cache.put_many(encoder.key, ids, hashes, vectors)
+        stats['encoded'] += len(ids)
+
+    # Look at the first missed batch before loading the model; a fully cached corpus starts no pool
+    batches = missing_batches()
+    first = next(batches, None)
+    if first is not None:
+        batches = chain([first], batches)
+        if processes == 1:
+            for ids, hashes, texts in batches:
+                store(ids, hashes, encoder.encode(texts))
+        else:
+            # imap keeps submission order, so the queued ids and hashes line up with the results
+            meta = deque()
+
+            def texts_only():
+                for ids, hashes, texts in batches:
+                    meta.append((ids, hashes))
+                    yield texts
+
+            with Pool(processes, initializer=_init_worker, initargs=(encoder,)) as pool:
+                for vectors in pool.imap(_encode_batch, texts_only()):
+                    store(*meta.popleft(), vectors)
+
+    print(f"Embeddings ({encoder.key}): {stats['encoded']} encoded, {stats['cached']} cached")
+    # An arxiv_id listed more than once fills each of its rows
+    rows_of = {}
+    for i, arxiv_id in enumerate(arxiv_ids):
+        rows_of.setdefault(arxiv_id, []).append(i)
+    x = None
+    filled = 0
+    for arxiv_id, vector in cache.vectors(encoder.key):
+        rows = rows_of.get(arxiv_id)
+        if rows is None:
+            continue
+        if x is None:
+            x = np.zeros((len(arxiv_ids), len(vector)), dtype=np.float32)
+        x[rows] = vector
+        filled += len(rows)
+    assert filled == len(arxiv_ids), f"{len(arxiv_ids) - filled} papers have no cached embedding"
+    return x if x is not None else np.zeros((0, 0), dtype=np.float32)
@@ -1,8 +1,97 @@
+import os
+from collections.abc import Sequence
+
 import torch
 import pandas as pd
 import numpy as np
-import torch
 import random
+from torch_geometric.data.data import Data
+
+# Imported as src.load_arxiv_2023 by main.ipynb and TAPE, and as a top-level module by process.py and cli.py
+try:
+    from .artifacts import MANIFEST, load_artifacts
+except ImportError:
+    from artifacts import MANIFEST, load_artifacts
+
+DATA_PATH = 'dataset/arxiv_2023/geometric_data_processed.pt'
+PAPER_INFO_PATH = 'dataset/arxiv_2023_orig/paper_info.csv'
+TEXT_PATH = 'dataset/arxiv_2023/text'
+ARTIFACTS_PATH = 'dataset/arxiv_2023/artifacts'
+
+
+class TextStore(Sequence):
+    # All node texts are concatenated in node order into one utf-8 file, with a separate int64 offsets array.
+    # Both are memory-mapped and a text is only decoded when indexed, so paper_info.csv is never read in full
+    def __init__(self, path):
+        self.offsets = np.load(f'{path}.offsets.npy', mmap_mode='r')
+        self.buffer = np.memmap(f'{path}.bin', dtype=np.uint8, mode='r') if self.offsets[-1] else b''
+
+    @staticmethod
+    def build(texts, path):
+        offsets = [0]
+        tmp_path = f'{path}.bin.tmp'
+        with open(tmp_path, 'wb') as f:
+            for text in texts:
+                offsets.append(offsets[-1] + f.write(text.encode('utf-8')))
+        np.save(f'{path}.offsets.npy', np.array(offsets, dtype=np.int64))
+        # The .bin is written last, so if it exists the offsets are complete
+        os.replace(tmp_path, f'{path}.bin')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self.buffer[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+
+def load_text_store(path=TEXT_PATH, paper_info_path=PAPER_INFO_PATH):
+    # Rebuild when paper_info.csv is newer than the text files (process.py ran again)
+    if not os.path.exists(f'{path}.bin') or os.path.getmtime(f'{path}.bin') < os.path.getmtime(paper_info_path):
+        df = pd.read_csv(paper_info_path)
+        TextStore.build((f'Title: {ti}\nAbstract: {ab}' for ti, ab in zip(df['title'], df['abstract'])), path)
+    return TextStore(path)
+
+
+def make_split(num_nodes, seed):
+    # RandomState(seed) shuffles the same way np.random.seed(seed) does, so splits match the old ones.
+    # This leaves the global RNG alone; get_raw_text_arxiv_2023 advances it like the old shuffle did
+    node_id = np.arange(num_nodes)
+    np.random.RandomState(seed).shuffle(node_id)
+    train_id = np.sort(node_id[:int(num_nodes * 0.6)])
+    val_id = np.sort(node_id[int(num_nodes * 0.6):int(num_nodes * 0.8)])
+    test_id = np.sort(node_id[int(num_nodes * 0.8):])
+    return train_id, val_id, test_id
+
+
+def load_split(num_nodes, seed, artifacts=None):
+    # Prefer the split process.py wrote with the artifacts; splits for other seeds are cached next to
+    # geometric_data_processed.pt
+    names = [f'seed{seed}_{name}' for name in ('train_id', 'val_id', 'test_id')]
+    if artifacts is not None and all(name in artifacts for name in names):
+        return tuple(artifacts.array(name) for name in names)
+
+    path = os.path.join(os.path.dirname(DATA_PATH), 'splits', f'seed{seed}.npz')
+    if os.path.exists(path):
+        split = np.load(path)
+        if split['num_nodes'] == num_nodes:
+            return split['train_id'], split['val_id'], split['test_id']
+
+    train_id, val_id, test_id = make_split(num_nodes, seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, num_nodes=num_nodes, train_id=train_id, val_id=val_id, test_id=test_id)
+    return train_id, val_id, test_id
+
+
+def index_to_mask(index, num_nodes):
+    mask = np.zeros(num_nodes, dtype=bool)
+    mask[index] = True
+    return torch.from_numpy(mask)
 
 
 def get_raw_text_arxiv_2023(use_text=False, seed=0):
@@ -13,33 +102,31 @@ def get_raw_text_arxiv_2023(use_text=False, seed=0):
     np.random.seed(seed)  # Numpy module.
     random.seed(seed)  # Python random module.
 
-    data = torch.load('dataset/arxiv_2023/geometric_data_processed.pt')
+    # Map the artifacts written by process.py without copying the tensors if they exist; otherwise read the
+    # whole .pt
+    artifacts = None
+    if os.path.exists(os.path.join(ARTIFACTS_PATH, MANIFEST)):
+        artifacts = load_artifacts(ARTIFACTS_PATH)
+        data = Data(x=artifacts.x, edge_index=artifacts.edge_index, y=artifacts.y)
+    else:
+        data = torch.load(DATA_PATH)
 
     # split data
     data.num_nodes = len(data.y)
     num_nodes = data.num_nodes
-    node_id = np.arange(num_nodes)
-    np.random.shuffle(node_id)
-
-    data.train_id = np.sort(node_id[:int(num_nodes * 0.6)])
-    data.val_id = np.sort(
-        node_id[int(num_nodes * 0.6):int(num_nodes * 0.8)])
-    data.test_id = np.sort(node_id[int(num_nodes * 0.8):])
+    data.train_id, data.val_id, data.test_id = load_split(num_nodes, seed, artifacts)
+    # The split used to be drawn from the global RNG seeded above. Replay that shuffle so callers that draw
+    # from np.random after loading get the same stream as before, whether or not the split was cached
+    np.random.shuffle(np.arange(num_nodes))
 
-    data.train_mask = torch.tensor(
-        [x in data.train_id for x in range(num_nodes)])
-    data.val_mask = torch.tensor(
-        [x in data.val_id for x in range(num_nodes)])
-    data.test_mask = torch.tensor(
-        [x in data.test_id for x in range(num_nodes)])
+    data.train_mask = index_to_mask(data.train_id, num_nodes)
+    data.val_mask = index_to_mask(data.val_id, num_nodes)
+    data.test_mask = index_to_mask(data.test_id, num_nodes)
 
     # data.edge_index = data.adj_t.to_symmetric()
     if not use_text:
         return data, None
 
-    df = pd.read_csv('dataset/arxiv_2023_orig/paper_info.csv')
-    text = []
-    for ti, ab in zip(df['title'], df['abstract']):
-        text.append(f'Title: {ti}\nAbstract: {ab}')
-        # text.append((ti, ab))
-    return data, text
+    # Tokenizers only accept str, list or tuple, so hand out a plain list; the store still saves re-reading
+    # paper_info.csv with pandas on every load
+    return data, list(load_text_store())
@@ -0,0 +1,104 @@
+import glob
+import json
+import os
+import sqlite3
+import zlib
+
+
+def encode(record):
+    return zlib.compress(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+class PaperInfoStore:
+    # All S2 paper info lives in one SQLite file keyed by arxiv_id; records are compressed compact JSON. put()
+    # buffers until batch_size records and writes them in one transaction; existence checks and bulk reads are
+    # a single primary key scan
+    def __init__(self, path, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS paper_info (
+                arxiv_id TEXT PRIMARY KEY,
+                body BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def put(self, arxiv_id, record):
+        self._pending[arxiv_id] = encode(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO paper_info (arxiv_id, body) VALUES (?, ?)',
+                                  self._pending.items())
+        self._pending = {}
+
+    def ids(self):
+        self.flush()
+        return {row[0] for row in self.conn.execute('SELECT arxiv_id FROM paper_info')}
+
+    def get(self, arxiv_id):
+        if arxiv_id in self._pending:
+            return decode(self._pending[arxiv_id])
+        row = self.conn.execute('SELECT body FROM paper_info WHERE arxiv_id = ?', (arxiv_id,)).fetchone()
+        return decode(row[0]) if row else None
+
+    def raw_records(self):
+        # Raw records in arxiv_id order, so decoding can happen on a process pool
+        self.flush()
+        for row in self.conn.execute('SELECT body FROM paper_info ORDER BY arxiv_id'):
+            yield row[0]
+
+    def records(self):
+        for body in self.raw_records():
+            yield decode(body)
+
+    def count(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM paper_info').fetchone()[0]
+
+    def free_fraction(self):
+        self.flush()
+        page_count = self.conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return freelist_count / page_count if page_count else 0.0
+
+    def compact(self, min_free_fraction=0.1):
+        # Overwrites (completing truncated neighbour lists) leave free pages; VACUUM rewrites the whole file to
+        # reclaim them, so only run it once at least min_free_fraction of the pages are free.
+        # Returns True if the file was rewritten
+        if self.free_fraction() < min_free_fraction:
+            return False
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.conn.execute('VACUUM')
+        return True
+
+    def import_json_dir(self, directory):
+        # Import the old one-file-per-paper paper_info/*.json, without overwriting records already in the
+        # store
+        existing = self.ids()
+        imported = 0
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            arxiv_id = os.path.basename(path)[:-len('.json')]
+            if arxiv_id in existing:
+                continue
+            with open(path) as f:
+                self.put(arxiv_id, json.load(f))
+            imported += 1
+        self.flush()
+        return imported
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -1,118 +1,235 @@
-import torch
-import glob
-import json
+import os
+import sys
 import pandas as pd
 import numpy as np
 import time
-import gensim
 import argparse
-
-from torch_geometric.data.data import Data
-
-
-def load_word2vec_model(MODEL_PATH):
-
-    model = gensim.models.KeyedVectors.load_word2vec_format(
-        MODEL_PATH, binary=True)
-    return model
-
-
-def word2vec(model, text, hidden_dim=300):
-    words = text.split()  # Tokenize the text into words
-    word_vectors = []
-
-    for word in words:
-        try:
-            vector = model[word]  # Get the Word2Vec vector for the word
-            word_vectors.append(vector)
-        except KeyError:
-            # Handle the case where the word is not in the vocabulary
-            pass
-
-    if word_vectors:
-        # Calculate the mean of word vectors to represent the text
-        text_vector = sum(word_vectors) / len(word_vectors)
-    else:
-        # Handle the case where no word vectors were found
-        text_vector = np.zeros(hidden_dim)
-
-    return text_vector
+from itertools import islice
+from multiprocessing import Pool
+
+# metrics.py is shared with claude_arxiv
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'claude_arxiv'))
+
+from artifacts import save_artifacts
+from encoders import ENCODERS, EmbeddingCache, encode_corpus, make_encoder
+from metrics import METRICS, add_metrics_arguments, configure_metrics, write_metrics
+from paper_info_store import PaperInfoStore, decode
+
+
+def _read_paper_info(body):
+    data = decode(body)
+    return (data['paperId'], data['arxiv_id'], data['title'], data['abstract'], data['subject'],
+            [r['paperId'] for r in data['references']], [c['paperId'] for c in data['citations']])
+
+
+def read_paper_info(store, processes=None, block_size=65536):
+    # Read every record in one scan and decode on several processes. Node attributes are collected per column
+    # and neighbour paperIds are flattened into one list with a count per paper.
+    # The sqlite cursor may only be used on this thread, while imap pulls its input on the pool's task handler
+    # thread, so the bodies are read here in blocks and only each block is handed to the pool
+    columns = {'paperId': [], 'arxiv_id': [], 'title': [], 'abstract': [], 'subject': []}
+    neighbors = {'references': ([], []), 'citations': ([], [])}
+    bodies = store.raw_records()
+    with Pool(processes) as pool:
+        while True:
+            block = list(islice(bodies, block_size))
+            if not block:
+                break
+            for record in pool.imap(_read_paper_info, block, chunksize=256):
+                for column, value in zip(columns.values(), record[:5]):
+                    column.append(value)
+                for (ids, counts), paper_ids in zip(neighbors.values(), record[5:]):
+                    ids.extend(paper_ids)
+                    counts.append(len(paper_ids))
+    return columns, neighbors
+
+
+def build_edges(paperids, neighbors):
+    # Map neighbours inside the node set from references (paper -> neighbour) and citations (neighbour ->
+    # paper) to node ids. An edge seen from both sides is kept once. Returns int64 arrays sorted by (src, dst)
+    num_nodes = len(paperids)
+    paper_index = pd.Index(paperids)
+    # A paperId that appears more than once maps to its last node, like the old dict did
+    keep = ~paper_index.duplicated(keep='last')
+    lookup = pd.Index(paper_index[keep])
+    node_of = np.flatnonzero(keep)
+
+    srcs, dsts = [], []
+    for kind, (ids, counts) in neighbors.items():
+        owner = np.repeat(np.arange(num_nodes, dtype=np.int64), np.asarray(counts, dtype=np.int64))
+        position = lookup.get_indexer(ids)
+        hit = position >= 0
+        other = node_of[position[hit]]
+        owner = owner[hit]
+        srcs.append(owner if kind == 'references' else other)
+        dsts.append(other if kind == 'references' else owner)
+
+    keys = np.unique(np.concatenate(srcs) * num_nodes + np.concatenate(dsts))
+    return keys // num_nodes, keys % num_nodes
+
+
+def to_csr(src, dst, num_nodes):
+    # src is sorted, so the CSR row pointer is the prefix sum of out-degrees
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+    return indptr, dst
+
+
+def load_label_mapping(path='dataset/arxiv_2023/mapping/labelidx2arxivcategeory.csv.gz'):
+    # "arxiv cs ai" -> "ai"; returns a Series of label idx indexed by category abbreviation
+    mapping = pd.read_csv(path, compression='gzip', header=0, sep=',', quotechar='"', )
+    return pd.Series(mapping['label idx'].to_numpy(),
+                     index=mapping['arxiv category'].str.split(' ').str[-1])
+
+
+def map_labels(subjects, category2label):
+    # "Machine Learning (cs.LG)" -> "lg", then one categorical lookup in the label table; unknown or missing
+    # subjects get -1
+    categories = subjects.str.split('.').str[-1].str.split(')').str[0].str.lower()
+    codes = pd.Categorical(categories, categories=category2label.index).codes
+    return np.where(codes >= 0, category2label.to_numpy()[codes], -1)
+
+
+def select_papers(columns, neighbors, keep):
+    # Keep papers where keep is True; the neighbour lists use the same mask repeated by each paper's count
+    columns = {name: [value for value, k in zip(values, keep) if k] for name, values in columns.items()}
+    selected = {}
+    for kind, (ids, counts) in neighbors.items():
+        flat_keep = np.repeat(keep, counts)
+        selected[kind] = ([paper_id for paper_id, k in zip(ids, flat_keep) if k],
+                          [count for count, k in zip(counts, keep) if k])
+    return columns, selected
+
+
+def encoder_options(args):
+    if args.ENCODER == 'word2vec':
+        return {'model_path': args.MODEL_PATH, 'model_cache': args.MODEL_CACHE}
+    if args.ENCODER == 'tfidf-svd':
+        return {'model_path': args.ENCODER_MODEL or 'dataset/arxiv_2023_orig/tfidf_svd.pkl'}
+    return {'model_name': args.ENCODER_MODEL} if args.ENCODER_MODEL else {}
 
 
 def main(args):
+    # torch and torch_geometric are only needed from here on; importing them lazily keeps --help
+    # and the cli.py dispatcher fast
+    import torch
+    from torch_geometric.data.data import Data
+    from load_arxiv_2023 import ARTIFACTS_PATH, make_split
+
+    configure_metrics(args)
     start = time.time()
-    files = glob.glob(f'dataset/arxiv_2023_orig/paper_info/*.json')
-    paperids = []
-    paperid2arxivid = {}
-
-    arxiv_ids = []
-    titles = []
-    abstracts = []
-    subjects = []
-    for f in files:
-        data = json.load(open(f))
-        paperid2arxivid[data['paperId']] = data['arxiv_id']
-        paperids.append(data['paperId'])
-        arxiv_ids.append(data['arxiv_id'])
-        titles.append(data['title'])
-        abstracts.append(data['abstract'])
-        subjects.append(data['subject'])
-
-    df = pd.DataFrame({'arxiv_id': arxiv_ids, 'title': titles,
-                      'abstract': abstracts, 'subject': subjects})
-    df['node_id'] = [i for i in range(len(df))]
+    store = PaperInfoStore('dataset/arxiv_2023_orig/paper_info.sqlite')
+    # Data collected before the consolidated store still sits in one json file per paper
+    imported = store.import_json_dir('dataset/arxiv_2023_orig/paper_info')
+    if imported:
+        print(f"Imported {imported} paper_info json files into {store.path}")
+    with METRICS.stage('read'):
+        columns, neighbors = read_paper_info(store, args.PROCESSES)
+    store.close()
+    METRICS.inc('records_total', len(columns['paperId']), stage='read')
+
+    # construct labels first, so that an unmapped subject fails before the expensive stages
+    category2label = load_label_mapping()
+    with METRICS.stage('labels'):
+        labels = map_labels(pd.Series(columns['subject'], dtype=object), category2label)
+    unmapped = labels < 0
+    METRICS.inc('records_total', int(unmapped.sum()), stage='labels', outcome='unmapped')
+    if unmapped.any():
+        quarantined = pd.DataFrame({name: values for name, values in columns.items() if name != 'abstract'})[unmapped]
+        print(f"{unmapped.sum()} papers have a subject without a label:")
+        print(quarantined['subject'].value_counts(dropna=False).to_string())
+        if not args.DROP_UNMAPPED:
+            raise SystemExit("Fix the label mapping or rerun with --DROP_UNMAPPED to quarantine these papers")
+        quarantined.to_csv('dataset/arxiv_2023_orig/unmapped_paper_info.csv', index=False)
+        columns, neighbors = select_papers(columns, neighbors, ~unmapped)
+        labels = labels[~unmapped]
+
+    paperids = columns.pop('paperId')
+    titles, abstracts = columns['title'], columns['abstract']
+
+    df = pd.DataFrame(columns)
+    df['node_id'] = np.arange(len(df))
+    df['label'] = labels
+    y = torch.from_numpy(labels)
 
     print("Constructing a citation graph...")
 
     # construct nodes
-    model = load_word2vec_model(args.MODEL_PATH)
-    x = [word2vec(model, f"Title: {ti}\n Abstract: {ab}")
-         for ti, ab in zip(titles, abstracts)]
-    x = torch.Tensor(np.array(x))
+    texts = [f"Title: {ti}\n Abstract: {ab}" for ti, ab in zip(titles, abstracts)]
+    with METRICS.stage('features'):
+        encoder = make_encoder(args.ENCODER, **encoder_options(args))
+        if hasattr(encoder, 'fit'):
+            encoder.fit(texts)
+        # Embeddings are cached by (encoder, arxiv_id) together with a hash of the text,
+        # so only new or changed papers are encoded again
+        cache = EmbeddingCache(args.EMBEDDING_CACHE)
+        x = encode_corpus(encoder, zip(df['arxiv_id'], texts), cache, processes=args.PROCESSES)
+        cache.close()
+    x = torch.from_numpy(x)
 
     # construct edges
-    arxivid2nodeid = dict(zip(df['arxiv_id'], df['node_id']))
-    edges = []
-    for f in files:
-        data = json.load(open(f))
-
-        for r in data['references']:
-            if r['paperId'] in paperid2arxivid:
-                src = arxivid2nodeid[data['arxiv_id']]
-                dst = arxivid2nodeid[paperid2arxivid[r['paperId']]]
-                edges.append((src, dst))
-
-        for c in data['citations']:
-            if c['paperId'] in paperid2arxivid:
-                src = arxivid2nodeid[paperid2arxivid[c['paperId']]]
-                dst = arxivid2nodeid[data['arxiv_id']]
-                edges.append((src, dst))
-    edge_index = torch.tensor(edges).t()
-
-    # construct labels
-    mapping = pd.read_csv('dataset/arxiv_2023/mapping/labelidx2arxivcategeory.csv.gz',
-                          compression='gzip', header=0, sep=',', quotechar='"', )
-    mapping['arxiv category'] = mapping['arxiv category'].apply(
-        lambda x: x.split(' ')[-1])
-    category2label = dict(zip(mapping['arxiv category'], mapping['label idx']))
-    df['label'] = df['subject'].apply(
-        lambda x: category2label[x.split('.')[-1].split(')')[0].lower()])
-    y = torch.tensor(df['label'])
-
-    data = Data(x=x, edge_index=edge_index, y=y, num_nodes=len(df))
-    torch.save(data, f'dataset/arxiv_2023/geometric_data_processed.pt')
-    df.to_csv(f'dataset/arxiv_2023_orig/paper_info.csv', index=False)
+    with METRICS.stage('edges'):
+        src, dst = build_edges(paperids, neighbors)
+        edge_index = torch.from_numpy(np.stack([src, dst]))
+        indptr, indices = to_csr(src, dst, len(df))
+    METRICS.inc('edges_total', len(src))
+
+    with METRICS.stage('save'):
+        data = Data(x=x, edge_index=edge_index, y=y, num_nodes=len(df))
+        torch.save(data, f'dataset/arxiv_2023/geometric_data_processed.pt')
+
+        # The same tensors as separate memory-mappable arrays, plus the splits of the requested seeds
+        arrays = {'x': x.numpy(), 'edge_index': edge_index.numpy(), 'y': labels,
+                  'csr_indptr': indptr, 'csr_indices': indices}
+        for seed in args.SPLIT_SEEDS:
+            for name, index in zip(('train_id', 'val_id', 'test_id'), make_split(len(df), seed)):
+                arrays[f'seed{seed}_{name}'] = index
+        save_artifacts(ARTIFACTS_PATH, arrays, num_nodes=len(df), split_seeds=args.SPLIT_SEEDS)
+        df.to_csv(f'dataset/arxiv_2023_orig/paper_info.csv', index=False)
 
     print(
         f"Finish constructing a citation graph in {(time.time() - start)/60:.2f} mins")
     print("# nodes: ", data.num_nodes)
     print("# edges: ", data.num_edges)
+    write_metrics(args)
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
+def add_arguments(parser):
+    parser.add_argument('--ENCODER',
+                        type=str,
+                        default='word2vec',
+                        choices=sorted(ENCODERS),
+                        help='text encoder used for node features')
+    parser.add_argument('--ENCODER_MODEL',
+                        type=str,
+                        default=None,
+                        help='fitted TF-IDF+SVD pickle or sentence-transformers model name')
+    parser.add_argument('--EMBEDDING_CACHE',
+                        type=str,
+                        default='dataset/arxiv_2023_orig/embeddings.sqlite')
     parser.add_argument('--MODEL_PATH',
                         type=str,
                         default="~/word2vec/GoogleNews-vectors-negative300.bin.gz")
-    args = parser.parse_args()
-    main(args)
+    parser.add_argument('--MODEL_CACHE',
+                        type=str,
+                        default=None,
+                        help='memory-mapped copy of the model (default: MODEL_PATH with a .kv suffix)')
+    parser.add_argument('--PROCESSES',
+                        type=int,
+                        default=None,
+                        help='processes used to decode paper_info and encode texts (default: all cores)')
+    parser.add_argument('--DROP_UNMAPPED',
+                        action='store_true',
+                        help='drop papers whose subject has no label instead of aborting')
+    parser.add_argument('--SPLIT_SEEDS',
+                        type=int,
+                        nargs='*',
+                        default=[0],
+                        help='seeds whose train/val/test splits are stored with the artifacts')
+    add_metrics_arguments(parser, upper=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    main(parser.parse_args())
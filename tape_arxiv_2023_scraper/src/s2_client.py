@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import aiohttp
+
+# metrics.py is shared with claude_arxiv
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'claude_arxiv'))
+
+from metrics import METRICS
+
+S2_API_URL = os.environ.get('S2_API_URL', 'https://api.semanticscholar.org/graph/v1')
+S2_BATCH_URL = f'{S2_API_URL}/paper/batch'
+S2_NEIGHBORS_URL = S2_API_URL + '/paper/arXiv:{arxiv_id}/{kind}'
+MAX_BATCH_SIZE = 500  # paper/batch accepts at most 500 ids
+NEIGHBOR_PAGE_SIZE = 1000  # citations/references return at most 1000 entries per page
+# Key of the neighbour paper in paged responses, and the matching count field in batch responses
+NEIGHBOR_KINDS = {
+    'citations': ('citingPaper', 'citationCount'),
+    'references': ('citedPaper', 'referenceCount'),
+}
+
+
+def find_truncated(response):
+    # Inline citations/references from the batch endpoint are truncated; page through the rest when fewer than
+    # the count
+    truncated = []
+    for kind, (_, count_field) in NEIGHBOR_KINDS.items():
+        expected = response.get(count_field)
+        if kind in response and expected and len(response[kind] or []) < expected:
+            truncated.append((kind, expected))
+    return truncated
+
+
+class AdaptiveRateLimiter:
+    # Rate limiter shared by all requests: speeds up slowly on success, and on 429/503 pauses everyone for
+    # Retry-After and halves the rate
+    def __init__(self, rate=1.0, min_rate=0.05, max_rate=10.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Returns the seconds spent waiting, for the rate-limited metric
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return slot - now
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate * 1.05)
+
+    def on_throttle(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._next_slot = max(self._next_slot, time.monotonic() + pause)
+
+
+class ResponseCache:
+    # Persistent response cache keyed by (arxiv_id, fields); the failures table records each id's last error
+    # and attempts
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                arxiv_id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                body TEXT NOT NULL,
+                PRIMARY KEY (arxiv_id, fields)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS neighbors (
+                arxiv_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                paper_id TEXT NOT NULL,
+                PRIMARY KEY (arxiv_id, kind, paper_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS neighbor_progress (
+                arxiv_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                expected INTEGER NOT NULL,
+                next_offset INTEGER,
+                fetched INTEGER NOT NULL,
+                PRIMARY KEY (arxiv_id, kind)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS failures (
+                arxiv_id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_attempt REAL NOT NULL,
+                PRIMARY KEY (arxiv_id, fields)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+    def cached_ids(self, fields):
+        rows = self.conn.execute('SELECT arxiv_id FROM responses WHERE fields = ?', (fields,))
+        return {row[0] for row in rows}
+
+    def failed_ids(self, fields, reason=None):
+        if reason is None:
+            rows = self.conn.execute('SELECT arxiv_id FROM failures WHERE fields = ?', (fields,))
+        else:
+            rows = self.conn.execute(
+                'SELECT arxiv_id FROM failures WHERE fields = ? AND reason = ?', (fields, reason))
+        return {row[0] for row in rows}
+
+    def get(self, arxiv_id, fields):
+        row = self.conn.execute(
+            'SELECT body FROM responses WHERE arxiv_id = ? AND fields = ?', (arxiv_id, fields)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_many(self, fields, responses):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO responses (arxiv_id, fields, body) VALUES (?, ?, ?)',
+                [(arxiv_id, fields, json.dumps(body)) for arxiv_id, body in responses.items()])
+            self.conn.executemany(
+                'DELETE FROM failures WHERE arxiv_id = ? AND fields = ?',
+                [(arxiv_id, fields) for arxiv_id in responses])
+
+    def record_failures(self, fields, arxiv_ids, reason):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO failures (arxiv_id, fields, reason, attempts, last_attempt) VALUES (?, ?, ?, 1, ?) '
+                'ON CONFLICT(arxiv_id, fields) DO UPDATE SET reason = excluded.reason, '
+                'attempts = attempts + 1, last_attempt = excluded.last_attempt',
+                [(arxiv_id, fields, reason, now) for arxiv_id in arxiv_ids])
+
+    def neighbor_offset(self, arxiv_id, kind):
+        # Offset of the next page: 0 if not started, None when finished
+        row = self.conn.execute(
+            'SELECT next_offset FROM neighbor_progress WHERE arxiv_id = ? AND kind = ?', (arxiv_id, kind)).fetchone()
+        return 0 if row is None else row[0]
+
+    def add_neighbors(self, arxiv_id, kind, paper_ids, expected, next_offset):
+        # Saved after every page, so an interrupted crawl resumes at next_offset
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO neighbors (arxiv_id, kind, paper_id) VALUES (?, ?, ?)',
+                [(arxiv_id, kind, paper_id) for paper_id in paper_ids])
+            fetched = self.conn.execute(
+                'SELECT COUNT(*) FROM neighbors WHERE arxiv_id = ? AND kind = ?', (arxiv_id, kind)).fetchone()[0]
+            self.conn.execute(
+                'INSERT OR REPLACE INTO neighbor_progress (arxiv_id, kind, expected, next_offset, fetched) '
+                'VALUES (?, ?, ?, ?, ?)', (arxiv_id, kind, expected, next_offset, fetched))
+
+    def neighbors(self, arxiv_id, kind):
+        rows = self.conn.execute(
+            'SELECT paper_id FROM neighbors WHERE arxiv_id = ? AND kind = ?', (arxiv_id, kind))
+        return [row[0] for row in rows]
+
+    def completeness(self):
+        # Progress per truncated paper: (arxiv_id, kind, expected, fetched, finished)
+        rows = self.conn.execute(
+            'SELECT arxiv_id, kind, expected, fetched, next_offset IS NULL FROM neighbor_progress')
+        return [(arxiv_id, kind, expected, fetched, bool(finished)) for arxiv_id, kind, expected, fetched, finished in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+class S2Client:
+    def __init__(self, cache, limiter=None, api_key=None, concurrency=2, max_retries=5):
+        self.cache = cache
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.api_key = api_key or os.environ.get('S2_API_KEY')
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    async def _request(self, session, method, url, **kwargs):
+        # Every request goes through the shared limiter; 429/5xx back off by Retry-After and raise once
+        # retries run out
+        endpoint = 's2-batch' if url == S2_BATCH_URL else 's2-neighbors'
+        for attempt in range(self.max_retries):
+            METRICS.inc('rate_limited_seconds_total', await self.limiter.acquire(), endpoint=endpoint)
+            if attempt:
+                METRICS.inc('http_retries_total', endpoint=endpoint)
+            try:
+                start = time.perf_counter()
+                async with session.request(method, url, **kwargs) as response:
+                    METRICS.inc('http_responses_total', endpoint=endpoint, status=response.status)
+                    if response.status in (429, 500, 502, 503, 504):
+                        retry_after = response.headers.get('Retry-After')
+                        self.limiter.on_throttle(float(retry_after) if retry_after and retry_after.isdigit() else None)
+                        continue
+                    response.raise_for_status()
+                    data = await response.read()
+                METRICS.observe('http_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+                METRICS.inc('bytes_in_total', len(data), endpoint=endpoint)
+                body = json.loads(data)
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                METRICS.inc('http_errors_total', endpoint=endpoint)
+                self.limiter.on_throttle()
+                if attempt == self.max_retries - 1:
+                    raise
+                continue
+            self.limiter.on_success()
+            return body
+        raise RuntimeError(f'gave up on {url} after {self.max_retries} attempts')
+
+    async def _post_batch(self, session, arxiv_ids, fields):
+        # Returns {arxiv_id: response, or None if S2 does not have it}
+        payload = {'ids': [f'arXiv:{arxiv_id}' for arxiv_id in arxiv_ids]}
+        results = await self._request(session, 'POST', S2_BATCH_URL, params={'fields': fields}, json=payload)
+        return dict(zip(arxiv_ids, results))
+
+    def _session(self):
+        headers = {'x-api-key': self.api_key} if self.api_key else {}
+        return aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=300))
+
+    async def enrich(self, arxiv_ids, fields, on_result=None):
+        # Only requests ids neither cached nor known to be not_found; returns (cache hits, fetched, failed)
+        done = self.cache.cached_ids(fields) | self.cache.failed_ids(fields, reason='not_found')
+        todo = [arxiv_id for arxiv_id in dict.fromkeys(arxiv_ids) if arxiv_id not in done]
+        batches = [todo[i:i + MAX_BATCH_SIZE] for i in range(0, len(todo), MAX_BATCH_SIZE)]
+        stats = {'cached': len(set(arxiv_ids)) - len(todo), 'fetched': 0, 'failed': 0}
+        queue = asyncio.Queue()
+        for batch in batches:
+            queue.put_nowait(batch)
+
+        async with self._session() as session:
+            async def worker():
+                while not queue.empty():
+                    batch = queue.get_nowait()
+                    try:
+                        results = await self._post_batch(session, batch, fields)
+                    except Exception as e:
+                        print(f'Batch of {len(batch)} ids failed: {e!r}')
+                        self.cache.record_failures(fields, batch, reason=type(e).__name__)
+                        stats['failed'] += len(batch)
+                        continue
+                    found = {arxiv_id: body for arxiv_id, body in results.items() if body is not None}
+                    missing = [arxiv_id for arxiv_id, body in results.items() if body is None]
+                    self.cache.put_many(fields, found)
+                    if missing:
+                        self.cache.record_failures(fields, missing, reason='not_found')
+                    stats['fetched'] += len(found)
+                    stats['failed'] += len(missing)
+                    if on_result is not None:
+                        for arxiv_id, body in found.items():
+                            on_result(arxiv_id, body)
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return stats
+
+    async def _page_neighbors(self, session, arxiv_id, kind, expected):
+        key = NEIGHBOR_KINDS[kind][0]
+        offset = self.cache.neighbor_offset(arxiv_id, kind)
+        while offset is not None:
+            url = S2_NEIGHBORS_URL.format(arxiv_id=arxiv_id, kind=kind)
+            page = await self._request(session, 'GET', url,
+                                       params={'fields': 'paperId', 'offset': offset, 'limit': NEIGHBOR_PAGE_SIZE})
+            paper_ids = [item[key]['paperId'] for item in page.get('data') or [] if item.get(key, {}).get('paperId')]
+            offset = page.get('next')
+            self.cache.add_neighbors(arxiv_id, kind, paper_ids, expected, offset)
+
+    async def fetch_neighbors(self, jobs):
+        # jobs: list of (arxiv_id, kind, expected). Pages of one paper are fetched in order, different papers
+        # concurrently, all within the same rate budget
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        failed = []
+
+        async with self._session() as session:
+            async def worker():
+                while not queue.empty():
+                    arxiv_id, kind, expected = queue.get_nowait()
+                    try:
+                        await self._page_neighbors(session, arxiv_id, kind, expected)
+                    except Exception as e:
+                        print(f'Paging {kind} of {arxiv_id} failed: {e!r}')
+                        failed.append((arxiv_id, kind))
+
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return failed